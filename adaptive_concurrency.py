@@ -0,0 +1,157 @@
+"""
+AIMD limit on concurrent outbound eBay calls.
+
+The limit grows by about one call per round trip while calls succeed with
+the limit fully used (additive increase) and is cut by
+EBAY_AIMD_BACKOFF when eBay throttles (429/503), a call times out, or
+smoothed latency climbs past EBAY_AIMD_LATENCY_TOLERANCE times the
+uncongested baseline (multiplicative decrease). Decreases are spaced at
+least one smoothed round trip apart, so a burst of 429s from calls that
+were already in flight counts once. In-flight calls therefore track what
+eBay currently accepts without tuning a fixed number per deployment.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+EBAY_AIMD_INITIAL_LIMIT = float(os.getenv("EBAY_AIMD_INITIAL_LIMIT", "10"))
+EBAY_AIMD_MIN_LIMIT = float(os.getenv("EBAY_AIMD_MIN_LIMIT", "1"))
+EBAY_AIMD_MAX_LIMIT = float(os.getenv("EBAY_AIMD_MAX_LIMIT", "50"))
+EBAY_AIMD_BACKOFF = float(os.getenv("EBAY_AIMD_BACKOFF", "0.7"))
+EBAY_AIMD_LATENCY_TOLERANCE = float(os.getenv("EBAY_AIMD_LATENCY_TOLERANCE", "2.5"))
+
+# Latency samples used for the uncongested baseline (a low percentile)
+BASELINE_SAMPLES = 200
+LATENCY_SMOOTHING = 0.2
+RECENT_CHANGES = 20
+
+def classify_error(error: BaseException):
+    """Map a failed call to a decrease reason, or None if it says nothing about load."""
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    status = getattr(error, "status", None)
+    if status in (429, 503):
+        return "throttled"
+    return None
+
+class AIMDLimiter:
+    """Concurrency limit adjusted by additive increase, multiplicative decrease."""
+
+    def __init__(
+        self,
+        initial: float = EBAY_AIMD_INITIAL_LIMIT,
+        minimum: float = EBAY_AIMD_MIN_LIMIT,
+        maximum: float = EBAY_AIMD_MAX_LIMIT,
+        backoff: float = EBAY_AIMD_BACKOFF,
+        latency_tolerance: float = EBAY_AIMD_LATENCY_TOLERANCE,
+    ):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.changes = {"increase": 0, "throttled": 0, "timeout": 0, "latency": 0}
+        self.recent_changes = deque(maxlen=RECENT_CHANGES)
+        self.smoothed_latency = None
+        self._samples = deque(maxlen=BASELINE_SAMPLES)
+        self._waiters = deque()
+        self._last_decrease = 0.0
+
+    async def acquire(self):
+        """Wait for an in-flight slot under the current limit."""
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # Woken but leaving: hand the slot to the next waiter
+                    self._wake()
+                raise
+        self.in_flight += 1
+
+    def release(self, latency: float, error: BaseException = None, cancelled: bool = False):
+        """
+        Free a slot and adjust the limit from how the call went.
+
+        A cancelled call (such as a losing hedge) only frees its slot.
+        """
+        saturated = self.in_flight >= int(self.limit)
+        self.in_flight -= 1
+        if not cancelled:
+            reason = classify_error(error) if error is not None else None
+            if reason is not None:
+                self._decrease(reason)
+            elif error is None:
+                self._observe_latency(latency, saturated)
+        self._wake()
+
+    def _observe_latency(self, latency: float, saturated: bool):
+        self._samples.append(latency)
+        if self.smoothed_latency is None:
+            self.smoothed_latency = latency
+        else:
+            self.smoothed_latency += LATENCY_SMOOTHING * (latency - self.smoothed_latency)
+        baseline = self.baseline_latency()
+        if baseline and self.smoothed_latency > baseline * self.latency_tolerance:
+            self._decrease("latency")
+        elif saturated and self.limit < self.maximum:
+            # About +1 per limit's worth of successful calls, i.e. per round trip
+            self._change(min(self.maximum, self.limit + 1.0 / self.limit), "increase")
+
+    def baseline_latency(self):
+        """Latency when eBay is not congested: the 10th percentile of recent successes."""
+        if len(self._samples) < 20:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[len(ordered) // 10]
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self._last_decrease < (self.smoothed_latency or 1.0):
+            return
+        self._last_decrease = now
+        self._change(max(self.minimum, self.limit * self.backoff), reason)
+
+    def _change(self, new_limit: float, reason: str):
+        previous = self.limit
+        self.limit = new_limit
+        self.changes[reason] += 1
+        if int(new_limit) != int(previous):
+            self.recent_changes.append({
+                "time": time.time(),
+                "from": int(previous),
+                "to": int(new_limit),
+                "reason": reason,
+            })
+            log = logger.debug if reason == "increase" else logger.warning
+            log(f"eBay concurrency limit {int(previous)} -> {int(new_limit)} ({reason})")
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def snapshot(self) -> dict:
+        baseline = self.baseline_latency()
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "smoothed_latency_seconds": round(self.smoothed_latency, 3) if self.smoothed_latency else None,
+            "baseline_latency_seconds": round(baseline, 3) if baseline else None,
+            "changes": dict(self.changes),
+            "recent_changes": list(self.recent_changes),
+        }
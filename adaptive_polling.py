@@ -0,0 +1,142 @@
+"""
+Per-search adaptive polling intervals.
+
+Each saved search keeps a smoothed estimate of how many new listings it
+sees per hour. The scheduler aims to poll often enough to pick up about
+POLL_TARGET_NEW_ITEMS new listings per check, so busy searches are polled
+more often and dormant ones back off. The interval always stays inside the
+floor and ceiling allowed by the owner's subscription tier, and the chosen
+SearchFrequency only seeds the starting interval.
+
+Intervals are snapped to INTERVAL_LADDER, where every step divides the
+next, and due times are placed on the search's hashed phase grid (see
+schedule_phase.py). Checks stay spread across the period, and searches that
+share a fetch key still meet on the slower one's grid points even when
+they poll at different rates.
+"""
+
+import math
+import os
+import random
+from datetime import datetime, timedelta
+
+from fetch_groups import fetch_key, fetch_key_id
+from models import SearchFrequency, SubscriptionTier
+from schedule_phase import align_due_time, phase_fraction
+
+FREQUENCY_INTERVALS = {
+    SearchFrequency.HOURLY: timedelta(hours=1),
+    SearchFrequency.DAILY: timedelta(days=1),
+}
+
+# Allowed polling intervals in seconds; each step divides the next
+INTERVAL_LADDER = (150, 300, 900, 1800, 3600, 7200, 14400, 43200, 86400)
+
+# (fastest, slowest) polling interval in seconds per tier, both on the ladder
+TIER_INTERVAL_BOUNDS = {
+    SubscriptionTier.FREE: (3600, 86400),
+    SubscriptionTier.BASIC: (900, 86400),
+    SubscriptionTier.PREMIUM: (150, 43200),
+}
+
+POLL_TARGET_NEW_ITEMS = float(os.getenv("POLL_TARGET_NEW_ITEMS", "1"))
+POLL_RATE_SMOOTHING = float(os.getenv("POLL_RATE_SMOOTHING", "0.3"))
+# Largest factor the interval may grow or shrink by after a single check
+POLL_MAX_STEP = float(os.getenv("POLL_MAX_STEP", "2"))
+# A failed check is retried after this many seconds, doubling per failure in a
+# row up to the search's interval, plus up to POLL_RETRY_JITTER of that again
+POLL_RETRY_BASE_SECONDS = float(os.getenv("POLL_RETRY_BASE_SECONDS", "30"))
+POLL_RETRY_JITTER = float(os.getenv("POLL_RETRY_JITTER", "0.5"))
+
+def interval_bounds(tier):
+    """Return the (floor, ceiling) polling interval in seconds for a subscription tier."""
+    return TIER_INTERVAL_BOUNDS.get(tier, TIER_INTERVAL_BOUNDS[SubscriptionTier.FREE])
+
+def clamp_interval(seconds: float, tier) -> int:
+    """Clamp an interval into the tier's bounds and snap it to the nearest ladder step."""
+    floor, ceiling = interval_bounds(tier)
+    seconds = min(max(seconds, floor), ceiling)
+    steps = [step for step in INTERVAL_LADDER if floor <= step <= ceiling]
+    return min(steps, key=lambda step: abs(math.log(step / seconds)))
+
+def current_interval(search) -> int:
+    """Return the interval a search is polled at, seeding it from its frequency."""
+    if search.poll_interval_seconds:
+        return clamp_interval(search.poll_interval_seconds, search.subscription_tier)
+    seed = FREQUENCY_INTERVALS.get(search.frequency, FREQUENCY_INTERVALS[SearchFrequency.DAILY])
+    return clamp_interval(seed.total_seconds(), search.subscription_tier)
+
+def update_hit_rate(previous_rate: float, new_items: int, elapsed_seconds: float) -> float:
+    """Fold one observation into the smoothed new-items-per-hour estimate."""
+    observed = new_items * 3600.0 / max(elapsed_seconds, 1.0)
+    return POLL_RATE_SMOOTHING * observed + (1 - POLL_RATE_SMOOTHING) * (previous_rate or 0.0)
+
+def expected_new_items(search, now: datetime) -> float:
+    """Estimate how many new listings a search has gathered since its last check."""
+    if search.last_checked_at:
+        elapsed = (now - search.last_checked_at).total_seconds()
+    else:
+        elapsed = current_interval(search)
+    return (search.hit_rate or 0.0) * elapsed / 3600.0
+
+def next_interval(previous_interval: int, hit_rate: float, tier) -> int:
+    """
+    Pick the next polling interval from the smoothed hit rate.
+
+    The interval targets POLL_TARGET_NEW_ITEMS new listings per check, moves
+    at most POLL_MAX_STEP times per check so one noisy result cannot swing it
+    from floor to ceiling, and is clamped and snapped by ``clamp_interval``.
+    """
+    if hit_rate > 0:
+        desired = POLL_TARGET_NEW_ITEMS * 3600.0 / hit_rate
+    else:
+        desired = float("inf")
+    desired = min(max(desired, previous_interval / POLL_MAX_STEP), previous_interval * POLL_MAX_STEP)
+    return clamp_interval(desired, tier)
+
+def next_due_at(search, interval: int, now: datetime) -> datetime:
+    """Return the next point on the search's phase grid after ``now``."""
+    return align_due_time(now, interval, phase_fraction(fetch_key_id(fetch_key(search))))
+
+def reschedule(search, new_items: int, now: datetime) -> dict:
+    """Build the schedule update for a search that was just checked."""
+    interval = current_interval(search)
+    if search.last_checked_at:
+        elapsed = (now - search.last_checked_at).total_seconds()
+    else:
+        elapsed = interval
+    hit_rate = update_hit_rate(search.hit_rate, new_items, elapsed)
+    interval = next_interval(interval, hit_rate, search.subscription_tier)
+    return {
+        "id": search.id,
+        "next_due_at": next_due_at(search, interval, now),
+        "last_checked_at": now,
+        "poll_interval_seconds": interval,
+        "hit_rate": hit_rate,
+        "failure_count": 0,
+    }
+
+def retry_delay(failures: int, interval: int) -> float:
+    """Seconds to wait before retrying after ``failures`` failed checks in a row."""
+    delay = POLL_RETRY_BASE_SECONDS * 2 ** min(max(failures - 1, 0), 32)
+    delay *= 1 + random.uniform(0, POLL_RETRY_JITTER)
+    return min(delay, interval)
+
+def retry_schedule(search, now: datetime) -> dict:
+    """
+    Build the schedule update for a search whose check failed, leaving its stats alone.
+
+    The retry comes after a short backoff instead of a full interval and is
+    deliberately off the phase grid; the next successful check puts the
+    search back on it.
+    """
+    interval = current_interval(search)
+    failures = (search.failure_count or 0) + 1
+    return {
+        "id": search.id,
+        "next_due_at": now + timedelta(seconds=retry_delay(failures, interval)),
+        "last_checked_at": search.last_checked_at,
+        "poll_interval_seconds": interval,
+        "hit_rate": search.hit_rate or 0.0,
+        "failure_count": failures,
+    }
@@ -0,0 +1,28 @@
+"""create scheduler_checkpoints table
+
+Revision ID: 3a6d90b7f215
+Revises: e81f4c6a2d93
+Create Date: 2026-10-17 14:08:51.640372
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3a6d90b7f215'
+down_revision = 'e81f4c6a2d93'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'scheduler_checkpoints',
+        sa.Column('worker_id', sa.String(), primary_key=True),
+        sa.Column('cycle_started_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('searches_dispatched', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('searches_completed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now())
+    )
+
+def downgrade():
+    op.drop_table('scheduler_checkpoints')
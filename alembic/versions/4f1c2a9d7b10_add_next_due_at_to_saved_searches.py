@@ -0,0 +1,27 @@
+"""add next_due_at to saved_searches
+
+Revision ID: 4f1c2a9d7b10
+Revises: manual_create_users
+Create Date: 2026-10-17 09:12:44.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '4f1c2a9d7b10'
+down_revision = 'manual_create_users'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Existing searches become due immediately
+    op.add_column(
+        'saved_searches',
+        sa.Column('next_due_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now())
+    )
+    op.create_index(op.f('ix_saved_searches_next_due_at'), 'saved_searches', ['next_due_at'], unique=False)
+
+def downgrade():
+    op.drop_index(op.f('ix_saved_searches_next_due_at'), table_name='saved_searches')
+    op.drop_column('saved_searches', 'next_due_at')
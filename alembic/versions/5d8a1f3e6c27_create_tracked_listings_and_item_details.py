@@ -0,0 +1,44 @@
+"""create tracked_listings and item_details tables
+
+Revision ID: 5d8a1f3e6c27
+Revises: b4e07d3c9a56
+Create Date: 2026-10-17 19:42:08.615390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5d8a1f3e6c27'
+down_revision = 'b4e07d3c9a56'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'tracked_listings',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('item_number', sa.BigInteger(), primary_key=True),
+        sa.Column('saved_search_id', sa.Integer(), sa.ForeignKey('saved_searches.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('tracked_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_tracked_listings_item_number', 'tracked_listings', ['item_number'])
+    op.create_table(
+        'item_details',
+        sa.Column('item_number', sa.BigInteger(), primary_key=True),
+        sa.Column('item_id', sa.String(), nullable=False),
+        sa.Column('price', sa.Float(), nullable=True),
+        sa.Column('currency', sa.String(), nullable=True),
+        sa.Column('buying_option', sa.String(), nullable=True),
+        sa.Column('end_time', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('status', sa.String(), nullable=False, server_default='active'),
+        sa.Column('refreshed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('refresh_due_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_item_details_refresh_due_at', 'item_details', ['refresh_due_at'])
+
+def downgrade():
+    op.drop_index('ix_item_details_refresh_due_at', table_name='item_details')
+    op.drop_table('item_details')
+    op.drop_index('ix_tracked_listings_item_number', table_name='tracked_listings')
+    op.drop_table('tracked_listings')
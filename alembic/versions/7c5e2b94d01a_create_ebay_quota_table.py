@@ -0,0 +1,27 @@
+"""create ebay_quota table
+
+Revision ID: 7c5e2b94d01a
+Revises: 3a6d90b7f215
+Create Date: 2026-10-17 16:42:03.118904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '7c5e2b94d01a'
+down_revision = '3a6d90b7f215'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'ebay_quota',
+        sa.Column('name', sa.String(), primary_key=True),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('calls_used', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now())
+    )
+
+def downgrade():
+    op.drop_table('ebay_quota')
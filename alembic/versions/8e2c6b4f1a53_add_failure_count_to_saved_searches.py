@@ -0,0 +1,21 @@
+"""add failure_count to saved_searches
+
+Revision ID: 8e2c6b4f1a53
+Revises: 5d8a1f3e6c27
+Create Date: 2026-10-17 21:05:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8e2c6b4f1a53'
+down_revision = '5d8a1f3e6c27'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('saved_searches', sa.Column('failure_count', sa.Integer(), nullable=False, server_default='0'))
+
+def downgrade():
+    op.drop_column('saved_searches', 'failure_count')
@@ -0,0 +1,23 @@
+"""add lease columns to saved_searches
+
+Revision ID: 9b3e5d21c4a8
+Revises: 4f1c2a9d7b10
+Create Date: 2026-10-17 10:03:27.554190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9b3e5d21c4a8'
+down_revision = '4f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('saved_searches', sa.Column('lease_owner', sa.String(), nullable=True))
+    op.add_column('saved_searches', sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True))
+
+def downgrade():
+    op.drop_column('saved_searches', 'lease_expires_at')
+    op.drop_column('saved_searches', 'lease_owner')
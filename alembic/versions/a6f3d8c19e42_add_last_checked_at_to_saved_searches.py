@@ -0,0 +1,21 @@
+"""add last_checked_at to saved_searches
+
+Revision ID: a6f3d8c19e42
+Revises: d27a8f03e6b4
+Create Date: 2026-10-17 12:38:52.470913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a6f3d8c19e42'
+down_revision = 'd27a8f03e6b4'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('saved_searches', sa.Column('last_checked_at', sa.DateTime(timezone=True), nullable=True))
+
+def downgrade():
+    op.drop_column('saved_searches', 'last_checked_at')
@@ -0,0 +1,29 @@
+"""create unlogged ebay_response_cache table
+
+Revision ID: b4e07d3c9a56
+Revises: 7c5e2b94d01a
+Create Date: 2026-10-17 18:05:27.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b4e07d3c9a56'
+down_revision = '7c5e2b94d01a'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'ebay_response_cache',
+        sa.Column('key', sa.String(), primary_key=True),
+        sa.Column('stored_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        prefixes=['UNLOGGED']
+    )
+    op.create_index('ix_ebay_response_cache_stored_at', 'ebay_response_cache', ['stored_at'])
+
+def downgrade():
+    op.drop_index('ix_ebay_response_cache_stored_at', table_name='ebay_response_cache')
+    op.drop_table('ebay_response_cache')
@@ -0,0 +1,26 @@
+"""create worker_metrics table
+
+Revision ID: c7d41e9a2f86
+Revises: 8e2c6b4f1a53
+Create Date: 2026-10-17 21:32:10.604518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c7d41e9a2f86'
+down_revision = '8e2c6b4f1a53'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'worker_metrics',
+        sa.Column('worker_id', sa.String(), primary_key=True),
+        sa.Column('snapshot', sa.JSON(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now())
+    )
+
+def downgrade():
+    op.drop_table('worker_metrics')
@@ -0,0 +1,23 @@
+"""add adaptive polling columns to saved_searches
+
+Revision ID: d27a8f03e6b4
+Revises: 9b3e5d21c4a8
+Create Date: 2026-10-17 11:21:05.902117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd27a8f03e6b4'
+down_revision = '9b3e5d21c4a8'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('saved_searches', sa.Column('poll_interval_seconds', sa.Integer(), nullable=True))
+    op.add_column('saved_searches', sa.Column('hit_rate', sa.Float(), nullable=False, server_default='0'))
+
+def downgrade():
+    op.drop_column('saved_searches', 'hit_rate')
+    op.drop_column('saved_searches', 'poll_interval_seconds')
@@ -0,0 +1,27 @@
+"""create seen_listings table
+
+Revision ID: e81f4c6a2d93
+Revises: a6f3d8c19e42
+Create Date: 2026-10-17 12:40:18.217663
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e81f4c6a2d93'
+down_revision = 'a6f3d8c19e42'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'seen_listings',
+        sa.Column('fetch_key', sa.String(), primary_key=True),
+        sa.Column('item_ids', sa.LargeBinary(), nullable=False),
+        sa.Column('item_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now())
+    )
+
+def downgrade():
+    op.drop_table('seen_listings')
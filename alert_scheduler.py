@@ -1,56 +1,467 @@
 import asyncio
+import heapq
 import logging
-from sqlalchemy.future import select
-from sqlalchemy.ext.asyncio import AsyncSession
+import os
+import signal
+import time
+from datetime import datetime, timedelta, timezone
+from adaptive_polling import expected_new_items, reschedule, retry_schedule
 from database_config import AsyncSessionLocal
+from ebay_client import EBAY_PAGE_SIZE, EbayPagingTruncated, close_ebay_client, get_ebay_client, page_size_for
+from ebay_listings import parse_timestamp
+from ebay_quota import quota
+from fair_queue import TIER_ORDER, TierFairQueue
+from fetch_groups import fetch_key_id, filter_for_search, price_window
+from item_refresh import run_item_refresh, track_listings
 from models import SavedSearch, User
+from scheduler_metrics import metrics
+from search_catalog import SearchCatalog
+from scheduler_checkpoint import CheckpointWriter, resume_after_restart
+from search_leases import (
+    SCHEDULER_LEASE_SECONDS,
+    WORKER_ID,
+    claim_by_tier,
+    drop_leases,
+    extend_leases,
+)
+from seen_listings import load_seen
+from worker_metrics import run_metrics_publisher
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-async def check_saved_searches():
-    """Background task to periodically check saved searches and send alerts."""
-    logger.info("Starting saved search checking task")
-    
-    while True:
+# Scheduler settings
+SCHEDULER_POLL_SECONDS = int(os.getenv("SCHEDULER_POLL_SECONDS", "60"))
+SCHEDULER_LOOKAHEAD_SECONDS = int(os.getenv("SCHEDULER_LOOKAHEAD_SECONDS", "300"))
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "5000"))
+# Fetch workers; how many fetch groups they actually run at once follows
+# the client's AIMD limit (EBAY_AIMD_*), up to this many
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "50"))
+SCHEDULER_SEARCH_TIMEOUT_SECONDS = float(os.getenv("SCHEDULER_SEARCH_TIMEOUT_SECONDS", "30"))
+# How long in-flight fetch groups get to finish after SIGTERM
+SCHEDULER_DRAIN_SECONDS = float(os.getenv("SCHEDULER_DRAIN_SECONDS", "20"))
+# Listings created this long before a group's last check are still fetched,
+# since eBay indexes new listings with a delay
+SCHEDULER_FETCH_OVERLAP_SECONDS = float(os.getenv("SCHEDULER_FETCH_OVERLAP_SECONDS", "300"))
+# Fetch groups dispatched per cycle; the rest wait in the fair queue
+SCHEDULER_GROUPS_PER_CYCLE = int(
+    os.getenv("SCHEDULER_GROUPS_PER_CYCLE", str(SCHEDULER_CONCURRENCY * SCHEDULER_POLL_SECONDS))
+)
+
+class DueQueue:
+    """In-memory min-heap of saved searches ordered by next_due_at."""
+
+    def __init__(self):
+        self._heap = []
+        self._queued = set()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, search_id):
+        return search_id in self._queued
+
+    def push(self, due_at: datetime, search):
+        """Queue a search row; searches already queued are ignored."""
+        if search.id in self._queued:
+            return
+        heapq.heappush(self._heap, (due_at, search.id, search))
+        self._queued.add(search.id)
+
+    def searches(self):
+        """Return every queued search."""
+        return [entry[2] for entry in self._heap]
+
+    def pop_due(self, now: datetime, limit: int = None):
+        """Pop every queued search whose due time has passed, earliest first."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            if limit is not None and len(due) >= limit:
+                break
+            _, search_id, search = heapq.heappop(self._heap)
+            self._queued.discard(search_id)
+            due.append(search)
+        return due
+
+    def seconds_until_next(self, now: datetime, cap: float) -> float:
+        """Seconds to sleep until the earliest queued search is due, capped."""
+        if not self._heap:
+            return cap
+        wait = (self._heap[0][0] - now).total_seconds()
+        return max(0.0, min(wait, cap))
+
+async def fetch_listings(key, min_price, max_price, since: datetime = None, page_size: int = EBAY_PAGE_SIZE):
+    """
+    Fetch the current listings for a fetch key from eBay, newest first.
+
+    ``since`` is the earliest last check of any search in the group. Each
+    of them saw every listing created before its own last check in a fetch
+    whose price window covered its own, so pages are read only until one
+    reaches listings created before ``since`` (less
+    SCHEDULER_FETCH_OVERLAP_SECONDS). A listing being in the seen set is no
+    such guarantee: the fetch that recorded it may have used a narrower
+    window or stopped earlier. The first page holds ``page_size``
+    listings, so a steady-state poll is one small page. Without ``since``
+    (no search in the group checked yet) one full page is the baseline.
+
+    If EBAY_MAX_PAGES run out before the cutoff, listings between it and
+    the last page would never be fetched. A walk that started with small
+    pages raises EbayPagingTruncated, so the group is retried (with full
+    pages) without moving its searches' last check. One that was already
+    reading full pages would fall just as short on a retry, so it logs a
+    warning and returns the newest listings.
+    """
+    logger.info(f"Fetching listings for: {key.query}")
+    client = get_ebay_client()
+    if since is None:
+        listings, _ = await client.search(key, min_price, max_price, sort="newlyListed", allow_stale=False)
+        return listings
+    cutoff = since - timedelta(seconds=SCHEDULER_FETCH_OVERLAP_SECONDS)
+    listings = []
+    pages = client.iter_pages(key, min_price, max_price, page_size, allow_stale=False)
+    try:
+        async for page in pages:
+            listings.extend(page)
+            created = [parse_timestamp(listing.created_at) for listing in page]
+            if any(stamp is not None and stamp <= cutoff for stamp in created):
+                break
+    except EbayPagingTruncated as e:
+        if page_size < EBAY_PAGE_SIZE:
+            logger.warning(
+                f"Paging for {key.query} stopped after {e.fetched} of {e.total} listings "
+                f"before reaching its last check; retrying with full pages"
+            )
+            raise
+        logger.warning(
+            f"Paging for {key.query} stopped after {e.fetched} of {e.total} listings "
+            f"before reaching its last check; older new listings are skipped"
+        )
+    finally:
+        await pages.aclose()
+    return listings
+
+def is_created_after(listing, cutoff: datetime) -> bool:
+    """Check a listing's creation time against ``cutoff``; listings without one pass."""
+    created = parse_timestamp(listing.created_at)
+    return created is None or created > cutoff
+
+async def process_group(key, searches, seen, now: datetime):
+    """
+    Fetch once for a group of searches sharing a fetch key and filter per search.
+
+    A listing is new for a search when the group first saw it after that
+    search was last checked and eBay says it was created no earlier than
+    SCHEDULER_FETCH_OVERLAP_SECONDS before that check, so a listing the seen
+    set forgot (or never had, after an edit or a discarded blob) is not
+    alerted again. A search's first check only records a baseline.
+    New listings are tracked for the search's user, so the item refresh
+    loop keeps their price and status current.
+
+    Returns:
+        Dict mapping the id of each search checked successfully to its number
+        of new listings
+    """
+    min_price, max_price = price_window(searches)
+    # Retries (after a page walk fell short, among other failures) read full pages
+    if any(search.failure_count for search in searches):
+        page_size = EBAY_PAGE_SIZE
+    else:
+        page_size = page_size_for(sum(expected_new_items(search, now) for search in searches))
+    since = min((search.last_checked_at for search in searches if search.last_checked_at), default=None)
+    started = time.monotonic()
+    try:
+        listings = await fetch_listings(key, min_price, max_price, since, page_size)
+    except Exception:
+        metrics.observe_fetch(time.monotonic() - started, ok=False)
+        raise
+    metrics.observe_fetch(time.monotonic() - started)
+
+    # Stamp unseen listings with the cycle time so searches checked in this
+    # cycle treat them as already seen next time
+    checked_at = int(now.timestamp())
+    seen.observe((listing.number for listing in listings), checked_at)
+
+    new_counts = {}
+    alerted = []
+    for search in searches:
+        try:
+            matches = filter_for_search(listings, search)
+            if search.last_checked_at is None:
+                new_listings = []
+            else:
+                since = int(search.last_checked_at.timestamp())
+                created_after = search.last_checked_at - timedelta(seconds=SCHEDULER_FETCH_OVERLAP_SECONDS)
+                new_listings = [
+                    listing for listing in matches
+                    if seen.first_seen_at(listing.number) > since
+                    and is_created_after(listing, created_after)
+                ]
+            # Here you would send alerts for new_listings
+            logger.info(f"Checking saved search {search.id}: {len(new_listings)} new of {len(matches)} listings")
+            new_counts[search.id] = len(new_listings)
+            if new_listings:
+                alerted.append((search, new_listings))
+        except Exception as e:
+            logger.error(f"Error processing saved search {search.id}: {str(e)}")
+    if alerted:
+        try:
+            async with AsyncSessionLocal() as session:
+                for search, new_listings in alerted:
+                    await track_listings(session, search.user_id, new_listings, search.id, now)
+                await session.commit()
+        except Exception as e:
+            # The alerts went out; only their price and status updates are lost
+            logger.error(f"Error tracking alerted listings for fetch group {fetch_key_id(key)}: {str(e)}")
+    return new_counts
+
+class GroupAdmission:
+    """
+    Admits fetch groups while fewer are running than the eBay client's AIMD limit.
+
+    A group makes its eBay calls one after another, so with no more groups
+    running than the limit they rarely queue for a call slot, and a group's
+    timeout, which starts once it is admitted, is spent on eBay calls.
+    """
+
+    def __init__(self, limiter=None):
+        self.limiter = limiter
+        self.running = 0
+        self._changed = asyncio.Condition()
+
+    def _has_room(self) -> bool:
+        return self.limiter is None or self.running < max(1, int(self.limiter.limit))
+
+    async def __aenter__(self):
+        async with self._changed:
+            await self._changed.wait_for(self._has_room)
+            self.running += 1
+
+    async def __aexit__(self, *exc_info):
+        async with self._changed:
+            self.running -= 1
+            self._changed.notify_all()
+
+def schedule_updates(searches, new_counts, now: datetime):
+    """Build schedule updates for a group: adapted for searches checked, unchanged stats for the rest."""
+    return [
+        reschedule(search, new_counts[search.id], now)
+        if search.id in new_counts else retry_schedule(search, now)
+        for search in searches
+    ]
+
+async def run_groups(
+    groups,
+    seen_sets,
+    now: datetime,
+    checkpoint: CheckpointWriter = None,
+    stop: asyncio.Event = None,
+    concurrency: int = None,
+    timeout: float = None,
+):
+    """
+    Process fetch groups on a bounded pool of worker coroutines.
+
+    ``seen_sets`` maps each fetch key to its SeenListings. Groups start only
+    while fewer are running than the eBay client's AIMD limit (see
+    GroupAdmission). Each group gets its own timeout from when it starts,
+    and failures are logged per search, so one slow or failing eBay call
+    never holds up the rest of the cycle. Finished groups are handed to
+    ``checkpoint`` as they complete; a failed checkpoint write
+    is logged and its batch retried with the next flush.
+
+    Once ``stop`` is set no new groups are started, and groups already in
+    flight get SCHEDULER_DRAIN_SECONDS to finish before they are cancelled.
+    If the cycle itself is cancelled or a worker fails, the other workers
+    are cancelled and awaited before the error propagates.
+
+    Returns:
+        Tuple of (new listing counts by search id for searches checked
+        successfully, number of groups that failed or timed out)
+    """
+    concurrency = max(1, concurrency or SCHEDULER_CONCURRENCY)
+    timeout = timeout or SCHEDULER_SEARCH_TIMEOUT_SECONDS
+    admission = GroupAdmission(get_ebay_client().concurrency)
+    pending = iter(groups.items())
+    new_counts = {}
+    failures = 0
+
+    async def worker():
+        nonlocal failures
+        for key, searches in pending:
+            if stop is not None and stop.is_set():
+                return
+            search_ids = ", ".join(str(search.id) for search in searches)
+            group_counts = {}
+            try:
+                async with admission:
+                    group_counts = await asyncio.wait_for(process_group(key, searches, seen_sets[key], now), timeout)
+                new_counts.update(group_counts)
+            except asyncio.TimeoutError:
+                failures += 1
+                logger.error(f"Timed out after {timeout}s processing saved searches {search_ids}")
+            except Exception as e:
+                failures += 1
+                logger.error(f"Error processing saved searches {search_ids}: {str(e)}")
+            if checkpoint is not None:
+                seen = {fetch_key_id(key): seen_sets[key]} if group_counts else {}
+                try:
+                    await checkpoint.add(schedule_updates(searches, group_counts, now), seen)
+                except Exception as e:
+                    # The batch stays buffered and is retried by the next flush
+                    logger.error(f"Error checkpointing saved searches {search_ids}: {str(e)}")
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(groups)))]
+    all_done = asyncio.gather(*workers)
+    try:
+        if stop is None:
+            await all_done
+        else:
+            stopped = asyncio.create_task(stop.wait())
+            try:
+                await asyncio.wait({all_done, stopped}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                stopped.cancel()
+            if not all_done.done():
+                logger.info(f"Stopping: draining in-flight fetch groups for up to {SCHEDULER_DRAIN_SECONDS}s")
+                await asyncio.wait({all_done}, timeout=SCHEDULER_DRAIN_SECONDS)
+                if not all_done.done():
+                    logger.warning("Drain deadline passed, cancelling unfinished fetch groups")
+                    raise asyncio.CancelledError()
+            await all_done
+    except asyncio.CancelledError:
+        await cancel_workers(workers)
+        if stop is None or not stop.is_set():
+            raise
+    except Exception:
+        await cancel_workers(workers)
+        raise
+    return new_counts, failures
+
+async def cancel_workers(workers):
+    """Cancel fetch workers and wait for them, so none outlive the cycle."""
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+
+async def check_saved_searches(stop: asyncio.Event = None):
+    """
+    Background task to periodically check saved searches and send alerts.
+
+    Runs until ``stop`` is set. Work still queued in memory at that point
+    is handed back so other workers can pick it up.
+    """
+    logger.info(f"Starting saved search checking task as worker {WORKER_ID}")
+    stop = stop or asyncio.Event()
+
+    queue = DueQueue()
+    fair_queue = TierFairQueue()
+    catalog = SearchCatalog()
+
+    try:
+        async with AsyncSessionLocal() as session:
+            await resume_after_restart(session)
+    except Exception as e:
+        logger.error(f"Error resuming after restart: {str(e)}")
+
+    while not stop.is_set():
         try:
+            now = datetime.now(timezone.utc)
+            cycle_started = time.monotonic()
+
             # Create a new session for this check
             async with AsyncSessionLocal() as session:
-                # Get all saved searches
-                result = await session.execute(
-                    select(SavedSearch.id, 
-                           SavedSearch.user_id,
-                           SavedSearch.search_query,
-                           SavedSearch.min_price,
-                           SavedSearch.max_price,
-                           SavedSearch.frequency,
-                           SavedSearch.locations,
-                           SavedSearch.listing_type)
+                # Apply notified search changes; definitions are read from memory from here on
+                await catalog.refresh(session)
+
+                # Top up the heap by leasing searches due within the lookahead window,
+                # split across tiers and bounded by what is already held in memory
+                horizon = now + timedelta(seconds=SCHEDULER_LOOKAHEAD_SECONDS)
+                capacity = SCHEDULER_BATCH_SIZE - len(queue) - fair_queue.search_count
+                if capacity > 0:
+                    for search in await claim_by_tier(
+                        session, now, horizon, capacity, fair_queue.weights, TIER_ORDER, catalog
+                    ):
+                        queue.push(search.next_due_at, search)
+
+                # Due searches join the fair queue, which decides what is fetched this cycle
+                fair_queue.add(queue.pop_due(now), now)
+                groups = fair_queue.take(SCHEDULER_GROUPS_PER_CYCLE, now)
+                due_searches = [search for searches in groups.values() for search in searches]
+                metrics.observe_dispatch(due_searches, datetime.now(timezone.utc))
+                logger.info(
+                    f"Dispatching {len(due_searches)} due saved searches in {len(groups)} fetch groups "
+                    f"({len(fair_queue)} groups waiting, {len(queue)} searches queued)"
                 )
-                saved_searches = result.all()
-                
-                logger.info(f"Found {len(saved_searches)} saved searches to check")
-                
-                # Process each saved search
-                for search in saved_searches:
-                    try:
-                        # Here you would implement the logic to:
-                        # 1. Query eBay API for the search
-                        # 2. Check for new results
-                        # 3. Send alerts if there are new results
-                        
-                        # For now, just log that we're checking
-                        logger.info(f"Checking saved search: {search.search_query}")
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing saved search {search.id}: {str(e)}")
-                        continue
-                
-            # Sleep for a minute before the next check
-            logger.info("Sleeping for 60 seconds before next check...")
-            await asyncio.sleep(60)
-            
+
+                # Load what each group has already seen in one query
+                key_ids = {key: fetch_key_id(key) for key in groups}
+                seen_by_id = await load_seen(session, key_ids.values())
+                seen_sets = {key: seen_by_id[key_id] for key, key_id in key_ids.items()}
+
+                # One eBay fetch per group, several groups in flight at once. Results
+                # are checkpointed in batches as groups finish.
+                checkpoint = CheckpointWriter(
+                    session, now, len(due_searches), lease_seconds=SCHEDULER_LOOKAHEAD_SECONDS + SCHEDULER_LEASE_SECONDS
+                )
+                if due_searches:
+                    await checkpoint.start()
+                new_counts, failures = await run_groups(groups, seen_sets, now, checkpoint, stop)
+                try:
+                    await checkpoint.flush()
+                except Exception as e:
+                    # Unrecorded searches stay leased until the lease lapses, then are checked again
+                    logger.error(f"Error writing final checkpoint of the cycle: {str(e)}")
+                if failures:
+                    logger.warning(f"{failures} of {len(groups)} fetch groups failed this cycle")
+
+                # Keep holding the searches still waiting in the fair queue
+                if fair_queue and not stop.is_set():
+                    lease_until = datetime.now(timezone.utc) + timedelta(
+                        seconds=SCHEDULER_LOOKAHEAD_SECONDS + SCHEDULER_LEASE_SECONDS
+                    )
+                    await extend_leases(session, fair_queue.search_ids(), lease_until)
+
+            metrics.observe_cycle(time.monotonic() - cycle_started, due_searches)
+            metrics.set_queue_depth(queue.searches() + fair_queue.searches(), len(fair_queue))
+            metrics.maybe_log()
+            fair_queue.log_waits()
+
+            # Sleep until the next search is due, or go straight on while behind
+            sleep_for = queue.seconds_until_next(datetime.now(timezone.utc), SCHEDULER_POLL_SECONDS)
+            if fair_queue:
+                sleep_for = 0
+            logger.info(f"Sleeping for {sleep_for:.0f} seconds before next check...")
+            await wait_for_stop(stop, sleep_for)
+
         except Exception as e:
             logger.error(f"Error in check_saved_searches: {str(e)}")
             # Sleep for a bit before trying again
-            await asyncio.sleep(60)
+            await wait_for_stop(stop, SCHEDULER_POLL_SECONDS)
+
+    # Hand back everything claimed but not started
+    await catalog.close()
+    try:
+        async with AsyncSessionLocal() as session:
+            released = await drop_leases(session, WORKER_ID)
+        logger.info(f"Saved search checking task stopped, released {released} unstarted searches")
+    except Exception as e:
+        logger.error(f"Error releasing leases on shutdown: {str(e)}")
+
+async def wait_for_stop(stop: asyncio.Event, seconds: float):
+    """Sleep for ``seconds`` or until ``stop`` is set, whichever comes first."""
+    try:
+        await asyncio.wait_for(stop.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+async def run_scheduler():
+    """Run the alert scheduler until SIGTERM or SIGINT, draining in-flight work on the way out."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        await asyncio.gather(check_saved_searches(stop), run_item_refresh(stop), run_metrics_publisher(stop))
+    finally:
+        await close_ebay_client()
+        await quota.release_unused()
@@ -0,0 +1,98 @@
+"""
+Benchmark the lean listing decoder against the previous dict decoder.
+
+Decodes Browse search payloads both ways, the baseline being exactly what
+the client did before (aiohttp's ``response.json()`` and ``parse_item``),
+and reports time per listing and the memory kept by the decoded listings. Pass recorded responses with
+``--payload`` (repeatable); otherwise pages are synthesized with the fake
+eBay server's item generator.
+
+Usage:
+    python bench_listing_decoder.py --pages 50 --repeat 5
+    python bench_listing_decoder.py --payload recorded/search1.json --payload recorded/search2.json
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from ebay_listings import decode_search, loads, orjson
+from fake_ebay_server import make_item
+
+def parse_item(item: dict) -> dict:
+    """The previous ebay_client.parse_item, kept verbatim as the baseline."""
+    price = item.get("price") or {}
+    try:
+        value = float(price["value"])
+    except (KeyError, TypeError, ValueError):
+        value = None
+    return {
+        "itemId": item.get("itemId"),
+        "legacyItemId": item.get("legacyItemId"),
+        "title": item.get("title"),
+        "price": value,
+        "currency": price.get("currency"),
+        "url": item.get("itemWebUrl"),
+        "buyingOptions": item.get("buyingOptions", []),
+        "country": (item.get("itemLocation") or {}).get("country"),
+        "itemCreationDate": item.get("itemCreationDate"),
+    }
+
+def dict_decode(body: bytes):
+    """The previous path: ``response.json()`` (decode to text, then ``json.loads``) and ``parse_item``."""
+    data = json.loads(body.decode("utf-8"))
+    return [parse_item(item) for item in data.get("itemSummaries", [])]
+
+def lean_decode(body: bytes):
+    listings, _ = decode_search(loads(body))
+    return listings
+
+def synthesize(pages: int, page_size: int = 200):
+    now = int(time.time())
+    payloads = []
+    for page in range(pages):
+        items = [make_item(f"query {page}", number, now) for number in range(page_size)]
+        payloads.append(json.dumps({"total": page_size, "itemSummaries": items}).encode())
+    return payloads
+
+def measure(decode, payloads, repeat: int):
+    """Best time per listing over ``repeat`` runs, and memory kept per decoded listing."""
+    best = None
+    for _ in range(repeat):
+        count = 0
+        started = time.perf_counter()
+        for body in payloads:
+            count += len(decode(body))
+        elapsed = (time.perf_counter() - started) / max(count, 1)
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    kept = [decode(body) for body in payloads]
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    listings = sum(len(page) for page in kept)
+    return best * 1e6, retained / max(listings, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark eBay listing decoding")
+    parser.add_argument("--payload", action="append", default=[], help="Recorded search response JSON file")
+    parser.add_argument("--pages", type=int, default=50, help="Pages to synthesize without --payload")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.payload:
+        payloads = []
+        for path in args.payload:
+            with open(path, "rb") as payload_file:
+                payloads.append(payload_file.read())
+    else:
+        payloads = synthesize(args.pages)
+    size = sum(len(body) for body in payloads)
+    print(f"{len(payloads)} payloads, {size / 1024:.0f} KiB, parser: {'orjson' if orjson else 'json'}")
+    for name, decode in (("previous dicts", dict_decode), ("lean Listing", lean_decode)):
+        per_listing, retained = measure(decode, payloads, args.repeat)
+        print(f"{name:>14}: {per_listing:6.2f} us/listing, {retained:6.0f} bytes kept/listing")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark the price window index against checking every search.
+
+Generates saved search price windows shaped like real ones (most have a
+window a few times wide around a typical price, some only a minimum or
+maximum, some none) and listing prices from the same range, checks the
+index returns exactly what a linear ``price_matches`` scan does, and
+reports time per lookup for both, for filtering a percolator-sized
+candidate list, and the cost of editing a search.
+
+Usage:
+    python bench_price_index.py --searches 1000000 --lookups 2000
+"""
+
+import argparse
+import random
+import time
+
+from fetch_groups import price_matches
+from price_index import PriceIndex
+
+def make_window(rng: random.Random):
+    typical = rng.lognormvariate(4, 1.5)
+    shape = rng.random()
+    if shape < 0.1:
+        return None, None
+    if shape < 0.3:
+        return round(typical, 2), None
+    if shape < 0.4:
+        return None, round(typical, 2)
+    width = rng.uniform(1.2, 5)
+    return round(typical / width, 2), round(typical * width, 2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--searches", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--edits", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    windows = [make_window(rng) for _ in range(args.searches)]
+    prices = [round(rng.lognormvariate(4, 1.7), 2) for _ in range(args.lookups)]
+
+    started = time.perf_counter()
+    index = PriceIndex()
+    for search_id, (min_price, max_price) in enumerate(windows):
+        index.add(search_id, min_price, max_price)
+    print(f"indexed {args.searches} price windows in {time.perf_counter() - started:.1f}s")
+
+    matches = 0
+    started = time.perf_counter()
+    for price in prices:
+        matches += len(index.containing(price))
+    indexed = (time.perf_counter() - started) / len(prices)
+    average = matches / len(prices)
+
+    checked = prices[:max(1, min(len(prices), 50))]
+    linear = 0.0
+    for price in checked:
+        started = time.perf_counter()
+        expected = {
+            search_id for search_id, (min_price, max_price) in enumerate(windows)
+            if price_matches(price, min_price, max_price)
+        }
+        linear += time.perf_counter() - started
+        if expected != index.containing(price):
+            raise SystemExit(f"index disagrees with linear scan at price {price}")
+    linear /= len(checked)
+    print(f"index: {indexed * 1e3:.2f}ms per lookup, linear scan: {linear * 1e3:.1f}ms ({average:.0f} matches per lookup)")
+
+    # After keyword matching only a few hundred candidates are left to check
+    candidates = [rng.sample(range(args.searches), 300) for _ in range(len(prices))]
+    started = time.perf_counter()
+    for price, search_ids in zip(prices, candidates):
+        index.filter(search_ids, price)
+    print(f"filtering 300 keyword candidates: {(time.perf_counter() - started) / len(prices) * 1e6:.0f}us per listing")
+
+    started = time.perf_counter()
+    for _ in range(args.edits):
+        search_id = rng.randrange(args.searches)
+        windows[search_id] = make_window(rng)
+        index.add(search_id, *windows[search_id])
+    print(f"edits: {(time.perf_counter() - started) / args.edits * 1e6:.1f}us per changed window")
+
+    for price in prices[:20]:
+        expected = {
+            search_id for search_id, (min_price, max_price) in enumerate(windows)
+            if price_matches(price, min_price, max_price)
+        }
+        if expected != index.containing(price):
+            raise SystemExit(f"index disagrees with linear scan after edits at price {price}")
+    print("index matches linear scan before and after edits")
+
+if __name__ == "__main__":
+    main()
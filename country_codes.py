@@ -0,0 +1,117 @@
+"""
+Map free-form saved search locations to ISO 3166-1 alpha-2 country codes.
+
+The Browse API's ``itemLocationCountry`` filter and a listing's
+``itemLocation.country`` both use two-letter ISO codes, but users type
+locations as "UK", "United States" or "deutschland". ``country_code``
+accepts an ISO code, a common English name or one of a few well known
+aliases; anything else is unmapped.
+"""
+
+ISO_COUNTRY_CODES = frozenset("""
+AD AE AF AG AI AL AM AO AQ AR AS AT AU AW AX AZ BA BB BD BE BF BG BH BI BJ BL
+BM BN BO BQ BR BS BT BV BW BY BZ CA CC CD CF CG CH CI CK CL CM CN CO CR CU CV
+CW CX CY CZ DE DJ DK DM DO DZ EC EE EG EH ER ES ET FI FJ FK FM FO FR GA GB GD
+GE GF GG GH GI GL GM GN GP GQ GR GS GT GU GW GY HK HM HN HR HT HU ID IE IL IM
+IN IO IQ IR IS IT JE JM JO JP KE KG KH KI KM KN KP KR KW KY KZ LA LB LC LI LK
+LR LS LT LU LV LY MA MC MD ME MF MG MH MK ML MM MN MO MP MQ MR MS MT MU MV MW
+MX MY MZ NA NC NE NF NG NI NL NO NP NR NU NZ OM PA PE PF PG PH PK PL PM PN PR
+PS PT PW PY QA RE RO RS RU RW SA SB SC SD SE SG SH SI SJ SK SL SM SN SO SR SS
+ST SV SX SY SZ TC TD TF TG TH TJ TK TL TM TN TO TR TT TV TW TZ UA UG UM US UY
+UZ VA VC VE VG VI VN VU WF WS YE YT ZA ZM ZW
+""".split())
+
+# Names and aliases users commonly type, uppercased
+COUNTRY_ALIASES = {
+    "UK": "GB",
+    "GREAT BRITAIN": "GB",
+    "BRITAIN": "GB",
+    "ENGLAND": "GB",
+    "SCOTLAND": "GB",
+    "WALES": "GB",
+    "NORTHERN IRELAND": "GB",
+    "UNITED KINGDOM": "GB",
+    "USA": "US",
+    "U.S.": "US",
+    "U.S.A.": "US",
+    "AMERICA": "US",
+    "UNITED STATES": "US",
+    "UNITED STATES OF AMERICA": "US",
+    "CANADA": "CA",
+    "CAN": "CA",
+    "AUSTRALIA": "AU",
+    "AUS": "AU",
+    "NEW ZEALAND": "NZ",
+    "IRELAND": "IE",
+    "GERMANY": "DE",
+    "DEUTSCHLAND": "DE",
+    "DEU": "DE",
+    "FRANCE": "FR",
+    "FRA": "FR",
+    "ITALY": "IT",
+    "ITALIA": "IT",
+    "ITA": "IT",
+    "SPAIN": "ES",
+    "ESPANA": "ES",
+    "ESP": "ES",
+    "NETHERLANDS": "NL",
+    "HOLLAND": "NL",
+    "BELGIUM": "BE",
+    "AUSTRIA": "AT",
+    "SWITZERLAND": "CH",
+    "POLAND": "PL",
+    "SWEDEN": "SE",
+    "NORWAY": "NO",
+    "DENMARK": "DK",
+    "FINLAND": "FI",
+    "PORTUGAL": "PT",
+    "GREECE": "GR",
+    "CZECH REPUBLIC": "CZ",
+    "CZECHIA": "CZ",
+    "HUNGARY": "HU",
+    "ROMANIA": "RO",
+    "JAPAN": "JP",
+    "JPN": "JP",
+    "CHINA": "CN",
+    "CHN": "CN",
+    "HONG KONG": "HK",
+    "TAIWAN": "TW",
+    "SOUTH KOREA": "KR",
+    "KOREA": "KR",
+    "SINGAPORE": "SG",
+    "MALAYSIA": "MY",
+    "THAILAND": "TH",
+    "INDIA": "IN",
+    "ISRAEL": "IL",
+    "MEXICO": "MX",
+    "BRAZIL": "BR",
+    "ARGENTINA": "AR",
+    "SOUTH AFRICA": "ZA",
+}
+
+def country_code(location: str):
+    """Return the ISO 3166-1 alpha-2 code for a location, or None if it is not a known country."""
+    value = " ".join((location or "").upper().split())
+    if value in ISO_COUNTRY_CODES:
+        return value
+    return COUNTRY_ALIASES.get(value)
+
+def parse_locations(locations: str):
+    """
+    Split a comma separated location list into country codes.
+
+    Returns:
+        Tuple of (sorted unique ISO codes, list of the entries that could
+        not be mapped)
+    """
+    codes = set()
+    unmapped = []
+    for part in (locations or "").split(","):
+        if not part.strip():
+            continue
+        code = country_code(part)
+        if code is None:
+            unmapped.append(part.strip())
+        else:
+            codes.add(code)
+    return sorted(codes), unmapped
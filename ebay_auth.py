@@ -0,0 +1,106 @@
+"""
+Process-wide cache of the eBay OAuth application access token.
+
+The token comes from the client credentials grant and lasts about two
+hours. The cache hands out the current token without any I/O and starts a
+refresh in the background once the token is within
+EBAY_TOKEN_REFRESH_MARGIN_SECONDS of expiry, so fetches never wait on a
+refresh in the steady state. Refreshes are single-flight: however many
+coroutines ask at once, only one token request is in flight, and callers
+only wait on it when there is no usable token at all.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+EBAY_APP_ID = os.getenv("EBAY_APP_ID", "")
+EBAY_CERT_ID = os.getenv("EBAY_CERT_ID", "")
+EBAY_OAUTH_SCOPE = os.getenv("EBAY_OAUTH_SCOPE", "https://api.ebay.com/oauth/api_scope")
+EBAY_TOKEN_REFRESH_MARGIN_SECONDS = float(os.getenv("EBAY_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+# Wait before retrying a failed background refresh while the old token is still valid
+EBAY_TOKEN_RETRY_SECONDS = float(os.getenv("EBAY_TOKEN_RETRY_SECONDS", "30"))
+
+TOKEN_PATH = "/identity/v1/oauth2/token"
+
+class EbayAuthError(Exception):
+    """The eBay token endpoint did not return a usable token."""
+
+class AppTokenCache:
+    """Application token shared by every eBay call in the process."""
+
+    def __init__(
+        self,
+        client,
+        app_id: str = EBAY_APP_ID,
+        cert_id: str = EBAY_CERT_ID,
+        scope: str = EBAY_OAUTH_SCOPE,
+        refresh_margin: float = EBAY_TOKEN_REFRESH_MARGIN_SECONDS,
+    ):
+        self.client = client
+        self.app_id = app_id
+        self.cert_id = cert_id
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self.refreshes = 0
+        self._token = None
+        self._expires_at = 0.0
+        self._next_attempt = 0.0
+        self._refresh_task = None
+
+    async def get(self) -> str:
+        """Return a valid token, refreshing ahead of expiry without blocking the caller."""
+        now = time.monotonic()
+        if self._token is not None and now < self._expires_at:
+            if now >= self._expires_at - self.refresh_margin and now >= self._next_attempt:
+                self._start_refresh()
+            return self._token
+        if now < self._next_attempt and (self._refresh_task is None or self._refresh_task.done()):
+            raise EbayAuthError("no eBay application token, waiting to retry after a failed refresh")
+        # No usable token: everyone waits on the same refresh
+        return await asyncio.shield(self._start_refresh())
+
+    def invalidate(self, token: str):
+        """Drop ``token`` after eBay rejected it, unless it has already been replaced."""
+        if self._token == token:
+            self._token = None
+            self._expires_at = 0.0
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+            self._refresh_task.add_done_callback(self._log_failure)
+        return self._refresh_task
+
+    def _log_failure(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self._next_attempt = time.monotonic() + EBAY_TOKEN_RETRY_SECONDS
+            logger.error(f"Error refreshing eBay application token: {str(task.exception())}")
+
+    async def _refresh(self) -> str:
+        started = time.monotonic()
+        async with self.client.session.post(
+            f"{self.client.base_url}{TOKEN_PATH}",
+            data={"grant_type": "client_credentials", "scope": self.scope},
+            auth=aiohttp.BasicAuth(self.app_id, self.cert_id),
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        ) as response:
+            if response.status >= 400:
+                raise EbayAuthError(f"token request failed with {response.status}: {await response.text()}")
+            data = await response.json(content_type=None)
+        try:
+            token = data["access_token"]
+            expires_in = float(data["expires_in"])
+        except (KeyError, TypeError, ValueError):
+            raise EbayAuthError("token response missing access_token or expires_in")
+        # Count the lifetime from when the request was sent, to be safe
+        self._token = token
+        self._expires_at = started + expires_in
+        self.refreshes += 1
+        logger.info(f"Refreshed eBay application token, valid for {expires_in:.0f}s")
+        return token
@@ -0,0 +1,318 @@
+"""
+Async eBay Browse API client for the alert scheduler.
+
+All calls go through one shared ``aiohttp`` session whose connector keeps
+connections alive between calls, caches DNS lookups and caps connections
+per host, so a fetch normally reuses a warm TLS connection instead of
+paying for a new handshake. Every call has a strict total timeout.
+
+Every call draws from the shared daily call budget in ``ebay_quota`` and,
+when EBAY_APP_ID and EBAY_CERT_ID are set, authenticates with the cached
+application token from ``ebay_auth`` (otherwise the static EBAY_OAUTH_TOKEN).
+Responses are cached briefly by ``response_cache``, so repeated identical
+requests neither reach eBay nor spend budget, and ``ebay_resilience`` fails
+calls fast while an endpoint is down and hedges slow ones. How many calls
+are in flight at once is set by the AIMD limit in ``adaptive_concurrency``.
+
+Point EBAY_API_BASE_URL at ``fake_ebay_server.py`` to run against a local
+stand-in instead of eBay.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+
+import aiohttp
+
+from adaptive_concurrency import AIMDLimiter
+from ebay_auth import EBAY_APP_ID, EBAY_CERT_ID, AppTokenCache
+from ebay_listings import decode_items, decode_search, loads
+from ebay_quota import quota
+from ebay_resilience import EndpointGuard
+from response_cache import ResponseCache, cache_key
+
+logger = logging.getLogger(__name__)
+
+EBAY_API_BASE_URL = os.getenv("EBAY_API_BASE_URL", "https://api.ebay.com")
+EBAY_MARKETPLACE_ID = os.getenv("EBAY_MARKETPLACE_ID", "EBAY_US")
+EBAY_OAUTH_TOKEN = os.getenv("EBAY_OAUTH_TOKEN", "")
+EBAY_PAGE_SIZE = int(os.getenv("EBAY_PAGE_SIZE", "200"))
+EBAY_MIN_PAGE_SIZE = int(os.getenv("EBAY_MIN_PAGE_SIZE", "10"))
+EBAY_MAX_PAGES = int(os.getenv("EBAY_MAX_PAGES", "5"))
+EBAY_MAX_CONNECTIONS = int(os.getenv("EBAY_MAX_CONNECTIONS", "100"))
+EBAY_CONNECTIONS_PER_HOST = int(os.getenv("EBAY_CONNECTIONS_PER_HOST", "20"))
+EBAY_TIMEOUT_SECONDS = float(os.getenv("EBAY_TIMEOUT_SECONDS", "10"))
+EBAY_CONNECT_TIMEOUT_SECONDS = float(os.getenv("EBAY_CONNECT_TIMEOUT_SECONDS", "3"))
+EBAY_KEEPALIVE_SECONDS = float(os.getenv("EBAY_KEEPALIVE_SECONDS", "60"))
+EBAY_DNS_CACHE_SECONDS = int(os.getenv("EBAY_DNS_CACHE_SECONDS", "300"))
+
+SEARCH_PATH = "/buy/browse/v1/item_summary/search"
+ITEMS_PATH = "/buy/browse/v1/item/"
+# The most item ids getItems accepts in one call
+ITEMS_BATCH_LIMIT = 20
+
+BUYING_OPTIONS = {
+    "auction": "AUCTION",
+    "buy_it_now": "FIXED_PRICE",
+}
+
+class EbayAPIError(Exception):
+    """An eBay API call returned an error status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"eBay API error {status}: {message}")
+        self.status = status
+
+class EbayRateLimited(EbayAPIError):
+    """eBay rejected a call with 429; ``retry_after`` is in seconds when eBay gave one."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(429, message)
+        self.retry_after = retry_after
+
+class EbayPagingTruncated(Exception):
+    """A page walk reached its page limit with older matches still unread."""
+
+    def __init__(self, fetched: int, total: int):
+        super().__init__(f"Stopped paging after {fetched} of {total} listings")
+        self.fetched = fetched
+        self.total = total
+
+def search_filter(key, min_price, max_price) -> str:
+    """Build the Browse API ``filter`` parameter for a fetch key and price window."""
+    parts = []
+    if min_price is not None or max_price is not None:
+        low = "" if min_price is None else f"{min_price:g}"
+        high = "" if max_price is None else f"{max_price:g}"
+        parts.append(f"price:[{low}..{high}]")
+        parts.append("priceCurrency:USD")
+    buying_option = BUYING_OPTIONS.get(key.listing_type)
+    if buying_option:
+        parts.append(f"buyingOptions:{{{buying_option}}}")
+    countries = [country for country in key.locations.split(",") if country]
+    # The API takes a single country; several are filtered after the fetch
+    if len(countries) == 1:
+        parts.append(f"itemLocationCountry:{countries[0]}")
+    return ",".join(parts)
+
+class EbayClient:
+    """Browse API client over one pooled, keep-alive aiohttp session."""
+
+    def __init__(self, base_url: str = EBAY_API_BASE_URL, token: str = EBAY_OAUTH_TOKEN, limiter=None):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.limiter = limiter
+        self.tokens = None
+        self.cache = None
+        self.concurrency = None
+        self.guards = {}
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The shared session, created on first use inside the running event loop."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=EBAY_MAX_CONNECTIONS,
+                limit_per_host=EBAY_CONNECTIONS_PER_HOST,
+                ttl_dns_cache=EBAY_DNS_CACHE_SECONDS,
+                keepalive_timeout=EBAY_KEEPALIVE_SECONDS,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=EBAY_TIMEOUT_SECONDS,
+                    sock_connect=EBAY_CONNECT_TIMEOUT_SECONDS,
+                ),
+                headers={
+                    "Accept": "application/json",
+                    "X-EBAY-C-MARKETPLACE-ID": EBAY_MARKETPLACE_ID,
+                },
+                raise_for_status=False,
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def get_json(self, path: str, params: dict, allow_stale: bool = True) -> dict:
+        """
+        GET any Browse API path through every layer a search uses.
+
+        The response cache, circuit breaker and hedging, call budget and
+        AIMD limit all apply, whichever of them this client has set up.
+        With ``allow_stale`` False only responses within the cache TTL are
+        reused (see ``ResponseCache.get_or_fetch``).
+        """
+        if self.cache is not None:
+            body = await self.cache.get_or_fetch(
+                cache_key(path, params), lambda: self._fetch_body(path, params), allow_stale
+            )
+            return loads(body)
+        return await self._fetch_json(path, params)
+
+    def guard(self, path: str) -> EndpointGuard:
+        """Circuit breaker and hedging state for one endpoint path."""
+        guard = self.guards.get(path)
+        if guard is None:
+            guard = self.guards[path] = EndpointGuard(path)
+        return guard
+
+    async def _fetch_json(self, path: str, params: dict) -> dict:
+        return loads(await self._fetch_body(path, params))
+
+    async def _fetch_body(self, path: str, params: dict) -> bytes:
+        return await self.guard(path).call(lambda: self._call(path, params))
+
+    async def _call(self, path: str, params: dict) -> bytes:
+        token = await self.tokens.get() if self.tokens is not None else self.token
+        if self.limiter is not None:
+            await self.limiter.acquire()
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        if self.concurrency is None:
+            return await self._request(path, params, headers, token)
+        await self.concurrency.acquire()
+        started = time.monotonic()
+        error = None
+        cancelled = False
+        try:
+            return await self._request(path, params, headers, token)
+        except asyncio.CancelledError:
+            # A losing hedge or a stopped worker says nothing about eBay's load
+            cancelled = True
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.concurrency.release(time.monotonic() - started, error, cancelled)
+
+    async def _request(self, path: str, params: dict, headers: dict, token: str) -> bytes:
+        async with self.session.get(f"{self.base_url}{path}", params=params, headers=headers) as response:
+            if response.status == 401 and self.tokens is not None:
+                # Revoked or expired early; the next call fetches a fresh token
+                self.tokens.invalidate(token)
+            if response.status == 429:
+                retry_after = response.headers.get("Retry-After")
+                raise EbayRateLimited(await response.text(), float(retry_after) if retry_after else None)
+            if response.status >= 400:
+                raise EbayAPIError(response.status, await response.text())
+            return await response.read()
+
+    async def search(
+        self,
+        key,
+        min_price=None,
+        max_price=None,
+        limit: int = EBAY_PAGE_SIZE,
+        offset: int = 0,
+        sort: str = None,
+        allow_stale: bool = True,
+    ):
+        """
+        Search active listings for a fetch key within a price window.
+
+        Pollers pass ``allow_stale=False`` so they never get the response an
+        earlier poll already saw.
+
+        Returns:
+            Tuple of (Listing records, total matches eBay reported)
+        """
+        params = {"q": key.query, "limit": str(limit), "offset": str(offset)}
+        if sort:
+            params["sort"] = sort
+        filters = search_filter(key, min_price, max_price)
+        if filters:
+            params["filter"] = filters
+        data = await self.get_json(SEARCH_PATH, params, allow_stale)
+        listings, total = decode_search(data)
+        countries = {country for country in key.locations.split(",") if country}
+        if len(countries) > 1:
+            listings = [listing for listing in listings if listing.country in countries]
+        return listings, total
+
+    async def get_items(self, item_ids):
+        """
+        Fetch current details for up to ITEMS_BATCH_LIMIT items in one call.
+
+        Bypasses the response cache; callers keep their own copy of item
+        state. Items that ended long ago or were removed are simply missing
+        from the result.
+
+        Returns:
+            List of Listing records
+        """
+        if len(item_ids) > ITEMS_BATCH_LIMIT:
+            raise ValueError(f"getItems takes at most {ITEMS_BATCH_LIMIT} item ids, got {len(item_ids)}")
+        try:
+            data = await self._fetch_json(ITEMS_PATH, {"item_ids": ",".join(item_ids)})
+        except EbayAPIError as e:
+            # None of the items exist any more
+            if e.status == 404:
+                return []
+            raise
+        return decode_items(data)
+
+    async def iter_pages(
+        self,
+        key,
+        min_price=None,
+        max_price=None,
+        page_size: int = EBAY_PAGE_SIZE,
+        max_pages: int = EBAY_MAX_PAGES,
+        allow_stale: bool = True,
+    ):
+        """
+        Yield pages of listings for a fetch key, newest listed first.
+
+        Pages are only fetched as the caller asks for them, so a caller that
+        stops at a listing it already knows never pays for older pages. A
+        first page that did not reach known listings was too small, so the
+        page size doubles up to EBAY_PAGE_SIZE whenever the offset allows.
+        A caller still asking for pages after ``max_pages`` while older
+        matches remain gets EbayPagingTruncated, so it can tell a walk cut
+        short from one that reached the last listing.
+        """
+        limit = max(1, min(page_size, EBAY_PAGE_SIZE))
+        offset = 0
+        total = 0
+        for _ in range(max_pages):
+            listings, total = await self.search(
+                key, min_price, max_price, limit, offset, sort="newlyListed", allow_stale=allow_stale
+            )
+            yield listings
+            offset += limit
+            if offset >= total:
+                return
+            # Browse wants the offset to be a multiple of the limit
+            if limit < EBAY_PAGE_SIZE and offset % (limit * 2) == 0:
+                limit = min(limit * 2, EBAY_PAGE_SIZE)
+        raise EbayPagingTruncated(offset, total)
+
+def page_size_for(expected_new: float) -> int:
+    """Page size that should hold a poll's expected new listings and reach a known one."""
+    return max(EBAY_MIN_PAGE_SIZE, min(EBAY_PAGE_SIZE, math.ceil(expected_new * 2) + EBAY_MIN_PAGE_SIZE // 2))
+
+_client = None
+
+def get_ebay_client() -> EbayClient:
+    """Return the process-wide client so every fetch shares one connection pool and call budget."""
+    global _client
+    if _client is None:
+        _client = EbayClient(limiter=quota)
+        _client.cache = ResponseCache()
+        _client.concurrency = AIMDLimiter()
+        if EBAY_APP_ID and EBAY_CERT_ID:
+            _client.tokens = AppTokenCache(_client)
+    return _client
+
+async def close_ebay_client():
+    """Close the shared client's connections; call on shutdown."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
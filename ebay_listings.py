@@ -0,0 +1,121 @@
+"""
+Lean decoding of eBay Browse search responses.
+
+Only the fields the alert pipeline uses are pulled out of each item
+summary, into a ``__slots__`` Listing record instead of a nested dict, and
+responses are parsed with ``orjson`` when it is installed (falling back to
+the standard library ``json``). See bench_listing_decoder.py for the
+comparison against the previous dict decoder.
+"""
+
+import json
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads(body):
+    """Parse a JSON response body, with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+def item_number(item) -> int:
+    """Return the numeric eBay item number for a Browse API item summary."""
+    legacy_id = item.get("legacyItemId")
+    if legacy_id:
+        return int(legacy_id)
+    # Browse API ids look like "v1|110551991234|0"
+    item_id = str(item["itemId"])
+    if "|" in item_id:
+        item_id = item_id.split("|")[1]
+    return int(item_id)
+
+def parse_timestamp(value):
+    """Parse an eBay ISO 8601 timestamp such as 2026-10-24T18:05:27.000Z."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+class Listing:
+    """One eBay listing, reduced to what alerts need."""
+
+    __slots__ = ("number", "item_id", "title", "price", "currency", "buying_option", "country", "created_at", "end_time", "url")
+
+    def __init__(self, number, item_id, title, price, currency, buying_option, country, created_at, end_time, url):
+        self.number = number
+        self.item_id = item_id
+        self.title = title
+        self.price = price
+        self.currency = currency
+        self.buying_option = buying_option
+        self.country = country
+        self.created_at = created_at
+        self.end_time = end_time
+        self.url = url
+
+    def __repr__(self):
+        return f"Listing({self.number}, {self.title!r}, {self.price} {self.currency})"
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+def decode_item(item: dict) -> Listing:
+    """Build a Listing from one Browse API item summary."""
+    price = item.get("price")
+    value = currency = None
+    if price:
+        currency = price.get("currency")
+        try:
+            value = float(price["value"])
+        except (KeyError, TypeError, ValueError):
+            pass
+    options = item.get("buyingOptions") or ()
+    location = item.get("itemLocation")
+    return Listing(
+        item_number(item),
+        item.get("itemId"),
+        item.get("title"),
+        value,
+        currency,
+        "AUCTION" if "AUCTION" in options else (options[0] if options else None),
+        location.get("country") if location else None,
+        item.get("itemCreationDate"),
+        item.get("itemEndDate"),
+        item.get("itemWebUrl"),
+    )
+
+def decode_search(data: dict):
+    """
+    Decode a parsed Browse search response.
+
+    Returns:
+        Tuple of (list of Listing, total matches eBay reported)
+    """
+    items = data.get("itemSummaries") or ()
+    return [decode_item(item) for item in items], data.get("total", len(items))
+
+def decode_items(data: dict):
+    """
+    Decode a parsed Browse getItems response.
+
+    Auctions report their current bid as the price. Items eBay no longer
+    has are absent from the result rather than errors.
+    """
+    listings = []
+    for item in data.get("items") or ():
+        listing = decode_item(item)
+        bid = item.get("currentBidPrice")
+        if bid and listing.buying_option == "AUCTION":
+            try:
+                listing.price = float(bid["value"])
+                listing.currency = bid.get("currency", listing.currency)
+            except (KeyError, TypeError, ValueError):
+                pass
+        listings.append(listing)
+    return listings
@@ -0,0 +1,236 @@
+"""
+Cross-process budget for eBay API calls.
+
+eBay allows EBAY_DAILY_CALL_LIMIT calls per quota day (which resets at
+midnight in EBAY_QUOTA_TIMEZONE). Workers draw calls from one shared
+``ebay_quota`` row in blocks of EBAY_QUOTA_BLOCK, so the common path is a
+local counter decrement and Postgres is only touched once per block. The
+row only hands out calls up to an even-spend line across the day plus
+EBAY_QUOTA_HEADROOM calls, so however many workers run, the budget lasts
+until the reset instead of running out mid-afternoon.
+
+The headroom is how far ahead of the line spending may get, not a rate
+limit: after a quiet spell up to EBAY_QUOTA_HEADROOM calls can go out as
+fast as the AIMD limit in ``adaptive_concurrency`` lets them. Per-second
+pacing is left to that limit and to eBay's 429 responses.
+
+``quota.status()`` and ``quota_status()`` report the remaining budget and
+when it would run out at the current rate of spend.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, time, timedelta, timezone
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database_config import AsyncSessionLocal
+from models import EbayQuota
+
+logger = logging.getLogger(__name__)
+
+EBAY_QUOTA_NAME = os.getenv("EBAY_QUOTA_NAME", "browse")
+EBAY_DAILY_CALL_LIMIT = int(os.getenv("EBAY_DAILY_CALL_LIMIT", "5000"))
+# Calls that may be handed out ahead of the even-spend line
+EBAY_QUOTA_HEADROOM = int(os.getenv("EBAY_QUOTA_HEADROOM", "50"))
+EBAY_QUOTA_BLOCK = int(os.getenv("EBAY_QUOTA_BLOCK", "10"))
+EBAY_QUOTA_MAX_WAIT_SECONDS = float(os.getenv("EBAY_QUOTA_MAX_WAIT_SECONDS", "10"))
+EBAY_QUOTA_TIMEZONE = os.getenv("EBAY_QUOTA_TIMEZONE", "America/Los_Angeles")
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TZ = ZoneInfo(EBAY_QUOTA_TIMEZONE)
+except Exception:
+    logger.warning(f"Unknown EBAY_QUOTA_TIMEZONE {EBAY_QUOTA_TIMEZONE}, using UTC")
+    QUOTA_TZ = timezone.utc
+
+class EbayQuotaExhausted(Exception):
+    """No eBay call can be made within the allowed wait; ``retry_after`` is in seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"eBay call budget exhausted, next call allowed in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+def quota_day(now: datetime):
+    """Return (start, end) of the quota day containing ``now``, as UTC datetimes."""
+    local = now.astimezone(QUOTA_TZ)
+    start = datetime.combine(local.date(), time(), tzinfo=QUOTA_TZ)
+    end = datetime.combine(local.date() + timedelta(days=1), time(), tzinfo=QUOTA_TZ)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+def allowed_calls(now: datetime, daily_limit: int, headroom: int) -> int:
+    """Calls that may have been used by ``now``: the even-spend line plus the headroom."""
+    start, end = quota_day(now)
+    fraction = (now - start).total_seconds() / (end - start).total_seconds()
+    return min(daily_limit, int(daily_limit * fraction) + headroom)
+
+def forecast(used: int, daily_limit: int, now: datetime, calls_per_second: float = None) -> dict:
+    """
+    Summarize a day's budget and when it would run out at the given rate.
+
+    Without a rate, the average rate since the start of the quota day is used.
+    """
+    start, end = quota_day(now)
+    if calls_per_second is None:
+        calls_per_second = used / max((now - start).total_seconds(), 1.0)
+    remaining = max(0, daily_limit - used)
+    exhausted_at = None
+    if remaining == 0:
+        exhausted_at = now
+    elif calls_per_second > 0:
+        exhausted_at = now + timedelta(seconds=remaining / calls_per_second)
+    runs_out_early = exhausted_at is not None and exhausted_at < end
+    return {
+        "daily_limit": daily_limit,
+        "used": used,
+        "remaining": remaining,
+        "calls_per_hour": round(calls_per_second * 3600, 1),
+        "exhausted_at": exhausted_at.isoformat() if runs_out_early else None,
+        "resets_at": end.isoformat(),
+    }
+
+async def quota_status(session: AsyncSession, name: str = EBAY_QUOTA_NAME, daily_limit: int = EBAY_DAILY_CALL_LIMIT):
+    """Read the shared budget row and forecast it; for processes that do not draw calls."""
+    now = datetime.now(timezone.utc)
+    result = await session.execute(select(EbayQuota).where(EbayQuota.name == name))
+    row = result.scalars().first()
+    used = row.calls_used if row is not None and row.day == now.astimezone(QUOTA_TZ).date() else 0
+    return {
+        "name": name,
+        "allowed_now": allowed_calls(now, daily_limit, EBAY_QUOTA_HEADROOM),
+        **forecast(used, daily_limit, now),
+    }
+
+class QuotaLimiter:
+    """A worker's local share of the eBay call budget, topped up from Postgres in blocks."""
+
+    def __init__(
+        self,
+        name: str = EBAY_QUOTA_NAME,
+        daily_limit: int = EBAY_DAILY_CALL_LIMIT,
+        headroom: int = EBAY_QUOTA_HEADROOM,
+        block: int = EBAY_QUOTA_BLOCK,
+        max_wait: float = EBAY_QUOTA_MAX_WAIT_SECONDS,
+    ):
+        self.name = name
+        self.daily_limit = daily_limit
+        self.headroom = headroom
+        self.block = block
+        self.max_wait = max_wait
+        self.used = 0
+        self.throttled = 0
+        self._available = 0
+        self._day = None
+        self._first_sample = None
+        self._last_sample = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Take one call from the budget, waiting up to ``max_wait`` for the spend line to allow it.
+
+        Raises:
+            EbayQuotaExhausted: if the next call is further away than ``max_wait``
+        """
+        today = datetime.now(timezone.utc).astimezone(QUOTA_TZ).date()
+        if self._available > 0 and self._day == today:
+            self._available -= 1
+            return
+        async with self._lock:
+            while True:
+                wait = await self._reserve()
+                if self._available > 0:
+                    self._available -= 1
+                    return
+                if wait > self.max_wait:
+                    self.throttled += 1
+                    raise EbayQuotaExhausted(wait)
+                await asyncio.sleep(wait)
+
+    async def _reserve(self) -> float:
+        """
+        Top up the local allowance from the shared row.
+
+        Returns:
+            Seconds until the shared budget can hand out another call, or 0
+            when calls are available locally
+        """
+        now = datetime.now(timezone.utc)
+        today = now.astimezone(QUOTA_TZ).date()
+        if self._day != today:
+            # Calls reserved yesterday were counted against yesterday's quota
+            self._available = 0
+            self._day = today
+            self._first_sample = None
+        if self._available > 0:
+            return 0.0
+        async with AsyncSessionLocal() as session:
+            await self._ensure_row(session, today)
+            result = await session.execute(
+                select(EbayQuota).where(EbayQuota.name == self.name).with_for_update()
+            )
+            row = result.scalars().first()
+            if row.day != today:
+                row.day = today
+                row.calls_used = 0
+            granted = max(0, min(self.block, allowed_calls(now, self.daily_limit, self.headroom) - row.calls_used))
+            row.calls_used += granted
+            row.updated_at = now
+            used = row.calls_used
+            await session.commit()
+        self._available += granted
+        self.used = used
+        self._last_sample = (now, used)
+        if self._first_sample is None:
+            self._first_sample = (now, used)
+        if granted:
+            return 0.0
+        start, end = quota_day(now)
+        if used >= self.daily_limit:
+            return (end - now).total_seconds()
+        # When the even-spend line reaches one more call than has been handed out
+        line_at = start + (end - start) * (used + 1 - self.headroom) / self.daily_limit
+        return max(0.0, (line_at - now).total_seconds())
+
+    async def _ensure_row(self, session: AsyncSession, today):
+        await session.execute(
+            insert(EbayQuota)
+            .values(name=self.name, day=today, calls_used=0)
+            .on_conflict_do_nothing(index_elements=[EbayQuota.name])
+        )
+
+    async def release_unused(self):
+        """Hand calls reserved but not made back to the shared budget; call on shutdown."""
+        if self._available <= 0:
+            return
+        unused, self._available = self._available, 0
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(EbayQuota).where(EbayQuota.name == self.name).with_for_update()
+                )
+                row = result.scalars().first()
+                if row is not None and row.day == self._day:
+                    row.calls_used = max(0, row.calls_used - unused)
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Error returning {unused} unused eBay calls to the budget: {str(e)}")
+
+    def status(self) -> dict:
+        """Remaining budget as of the last top-up, with a forecast at the recently observed rate of spend."""
+        now = datetime.now(timezone.utc)
+        rate = None
+        if self._first_sample and self._last_sample:
+            elapsed = (self._last_sample[0] - self._first_sample[0]).total_seconds()
+            if elapsed >= 60:
+                rate = (self._last_sample[1] - self._first_sample[1]) / elapsed
+        return {
+            "name": self.name,
+            "reserved_unspent": self._available,
+            "throttled": self.throttled,
+            **forecast(self.used, self.daily_limit, now, rate),
+        }
+
+quota = QuotaLimiter()
@@ -0,0 +1,409 @@
+"""
+Record eBay API traffic into fixtures and replay it with injected faults.
+
+``record`` runs a proxy in front of eBay (or any Browse API stand-in):
+point EBAY_API_BASE_URL at it and every search response is written to the
+fixture directory, one JSON file per distinct request (ignoring ``limit``
+and ``offset``) holding each response seen in order, with the page it
+covered, its status and how long eBay took. Token requests are passed
+through but not recorded.
+
+``replay`` serves a fixture directory back. Each request for a first page
+moves that request on to its next recorded snapshot (the first page and
+the pages read after it), then stays on the last one, so new listings
+appear exactly as they did while recording. Pages are cut from the
+snapshot's items by the requested ``limit`` and ``offset``, so a client
+sizing its pages differently from the recording run (the worker sizes
+them from each search's hit rate) is still answered. On top of that it
+injects, from a seeded random generator so runs are reproducible:
+
+- latency drawn from a distribution (``--latency``, see ``parse_latency``)
+- server errors, 500 or 503, at ``--error-rate``
+- 429 bursts: the last ``--burst-length`` requests of every
+  ``--burst-every`` are rejected with Retry-After
+
+Counting bursts in requests rather than seconds keeps them in the same
+place in the traffic however fast the client runs.
+
+Usage:
+    python ebay_replay.py record --upstream https://api.ebay.com --fixtures fixtures/ebay
+    EBAY_API_BASE_URL=http://localhost:8082 python worker.py
+
+    python ebay_replay.py replay --fixtures fixtures/ebay --latency lognormal:0.25,0.6 \\
+        --error-rate 0.01 --burst-every 500 --burst-length 40
+    EBAY_API_BASE_URL=http://localhost:8083 python worker.py
+
+    python ebay_replay.py bench --fixtures fixtures/ebay --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATH = "/identity/v1/oauth2/token"
+# Request headers the proxy passes on to eBay
+FORWARDED_HEADERS = ("Authorization", "Accept", "Content-Type", "X-EBAY-C-MARKETPLACE-ID")
+# Parameters selecting a page of a result rather than the result itself
+PAGING_PARAMS = ("limit", "offset")
+
+def fixture_name(path: str, params) -> str:
+    """File name for a request, independent of parameter order and of which page it asks for."""
+    names = sorted(name for name in params if name not in PAGING_PARAMS)
+    canonical = path + "?" + "&".join(f"{name}={params[name]}" for name in names)
+    return hashlib.sha1(canonical.encode()).hexdigest() + ".json"
+
+def build_snapshots(fixture: dict) -> list:
+    """
+    Group a fixture's responses into snapshots, each a first page and the pages read after it.
+
+    A snapshot holds the first response's status, timing and body, and,
+    when the pages carried ``itemSummaries``, every item recorded in it by
+    position along with the total eBay reported.
+    """
+    snapshots = []
+    for response in fixture["responses"]:
+        offset = int(response.get("offset", fixture["params"].get("offset", 0)))
+        if offset == 0 or not snapshots:
+            snapshots.append({**response, "items": None, "total": None})
+        snapshot = snapshots[-1]
+        if response["status"] != 200:
+            continue
+        try:
+            data = json.loads(response["body"])
+        except ValueError:
+            continue
+        if not isinstance(data, dict) or "itemSummaries" not in data:
+            continue
+        if snapshot["items"] is None:
+            snapshot["items"] = {}
+            snapshot["page"] = {name: value for name, value in data.items() if name not in ("itemSummaries", "next", "prev")}
+        for index, item in enumerate(data["itemSummaries"]):
+            snapshot["items"][offset + index] = item
+        snapshot["total"] = data.get("total", snapshot["total"])
+    for snapshot in snapshots:
+        if snapshot["items"] is not None:
+            # Only the recorded run of items from the top can be served
+            items = []
+            while len(items) in snapshot["items"]:
+                items.append(snapshot["items"][len(items)])
+            snapshot["items"] = items
+    return snapshots
+
+def load_fixtures(directory: str) -> dict:
+    """Read every fixture in ``directory`` into {file name: fixture}."""
+    fixtures = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name)) as f:
+                fixtures[name] = json.load(f)
+    return fixtures
+
+def parse_latency(spec: str):
+    """
+    Turn a latency spec into a function of (random generator, recorded seconds).
+
+    Specs:
+        ``0.2`` - fixed seconds
+        ``uniform:LOW,HIGH``
+        ``normal:MEAN,STDDEV`` (clipped at zero)
+        ``lognormal:MEDIAN,SIGMA`` - long-tailed, closest to real API latency
+        ``recorded`` or ``recorded:SCALE`` - what eBay took while recording, times SCALE
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",")] if args else []
+    if kind == "recorded":
+        scale = values[0] if values else 1.0
+        return lambda rng, recorded: recorded * scale
+    if kind == "uniform":
+        low, high = values
+        return lambda rng, recorded: rng.uniform(low, high)
+    if kind == "normal":
+        mean, stddev = values
+        return lambda rng, recorded: max(0.0, rng.gauss(mean, stddev))
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng, recorded: rng.lognormvariate(0.0, sigma) * median
+    fixed = float(spec)
+    return lambda rng, recorded: fixed
+
+def create_recorder(upstream: str, directory: str) -> web.Application:
+    """Proxy to ``upstream`` that saves search responses under ``directory``."""
+    upstream = upstream.rstrip("/")
+    os.makedirs(directory, exist_ok=True)
+    recorded = load_fixtures(directory)
+
+    def save(name: str, fixture: dict):
+        # Write then rename so a stopped recorder never leaves half a fixture
+        temporary = os.path.join(directory, name + ".tmp")
+        with open(temporary, "w") as f:
+            json.dump(fixture, f)
+        os.replace(temporary, os.path.join(directory, name))
+
+    async def proxy(request: web.Request):
+        headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+        body = await request.read()
+        started = time.monotonic()
+        async with app["session"].request(
+            request.method,
+            f"{upstream}{request.path}",
+            params=request.query,
+            headers=headers,
+            data=body or None,
+        ) as response:
+            text = await response.text()
+            elapsed = time.monotonic() - started
+            status = response.status
+            retry_after = response.headers.get("Retry-After")
+            content_type = response.headers.get("Content-Type", "application/json")
+        if request.method == "GET":
+            name = fixture_name(request.path, request.query)
+            fixture = recorded.setdefault(name, {"path": request.path, "params": dict(request.query), "responses": []})
+            fixture["responses"].append({
+                "offset": int(request.query.get("offset", "0")),
+                "limit": int(request.query.get("limit", "0")) or None,
+                "status": status,
+                "retry_after": retry_after,
+                "elapsed": round(elapsed, 4),
+                "recorded_at": time.time(),
+                "body": text,
+            })
+            save(name, fixture)
+            logger.info(f"Recorded {request.path} ({status}, {elapsed * 1000:.0f}ms) as {name}")
+        response_headers = {"Content-Type": content_type}
+        if retry_after:
+            response_headers["Retry-After"] = retry_after
+        return web.Response(status=status, text=text, headers=response_headers)
+
+    async def open_session(app: web.Application):
+        app["session"] = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+
+    async def close_session(app: web.Application):
+        await app["session"].close()
+
+    app = web.Application()
+    app.on_startup.append(open_session)
+    app.on_cleanup.append(close_session)
+    app.router.add_route("*", "/{tail:.*}", proxy)
+    return app
+
+def create_replayer(
+    fixtures: dict,
+    latency: str = "recorded",
+    error_rate: float = 0.0,
+    burst_every: int = 0,
+    burst_length: int = 0,
+    retry_after: int = 1,
+    seed: int = 0,
+) -> web.Application:
+    """
+    Serve recorded ``fixtures`` with injected latency, errors and 429 bursts.
+
+    Outcome counts (ok, error, throttled, missing) are kept in ``app["outcomes"]``.
+    """
+    # Re-keyed from the contents, so fixtures written before paging was
+    # ignored in the name merge into the request they belong to
+    merged = {}
+    for fixture in fixtures.values():
+        name = fixture_name(fixture["path"], fixture["params"])
+        responses = [
+            {"offset": int(fixture["params"].get("offset", 0)), **response} for response in fixture["responses"]
+        ]
+        if name in merged:
+            merged[name]["responses"].extend(responses)
+        else:
+            merged[name] = {**fixture, "responses": responses}
+    snapshots = {}
+    for name, fixture in merged.items():
+        fixture["responses"].sort(key=lambda response: response.get("recorded_at", 0))
+        snapshots[name] = build_snapshots(fixture)
+    rng = random.Random(seed)
+    delay_for = parse_latency(latency)
+    positions = Counter()
+    outcomes = Counter()
+    state = {"requests": 0}
+
+    async def search(request: web.Request):
+        number = state["requests"]
+        state["requests"] += 1
+        name = fixture_name(request.path, request.query)
+        recorded_snapshots = snapshots.get(name)
+        if recorded_snapshots is None:
+            outcomes["missing"] += 1
+            logger.warning(f"No fixture for {request.path_qs}")
+            return web.json_response({"errors": [{"message": "no recorded response"}]}, status=404)
+        offset = int(request.query.get("offset", "0"))
+        if offset == 0:
+            positions[name] += 1
+        recorded = recorded_snapshots[min(max(positions[name] - 1, 0), len(recorded_snapshots) - 1)]
+        # Draw everything up front so the random sequence does not depend on timing
+        delay = delay_for(rng, recorded.get("elapsed", 0.0))
+        failing = rng.random() < error_rate
+        failure_status = rng.choice((500, 503))
+        await asyncio.sleep(delay)
+        if burst_every and number % burst_every >= burst_every - burst_length:
+            outcomes["throttled"] += 1
+            return web.json_response(
+                {"errors": [{"errorId": 2001, "message": "Too many requests"}]},
+                status=429,
+                headers={"Retry-After": str(retry_after)},
+            )
+        if failing:
+            outcomes["error"] += 1
+            return web.json_response({"errors": [{"message": "injected failure"}]}, status=failure_status)
+        outcomes["ok"] += 1
+        headers = {"Retry-After": recorded["retry_after"]} if recorded.get("retry_after") else None
+        if recorded["items"] is None:
+            return web.Response(
+                status=recorded["status"],
+                text=recorded["body"],
+                content_type="application/json",
+                headers=headers,
+            )
+        items = recorded["items"]
+        limit = int(request.query.get("limit", str(recorded.get("limit") or len(items))))
+        total = recorded["total"] if recorded["total"] is not None else len(items)
+        if offset + limit > len(items) and len(items) < total:
+            logger.warning(f"Recorded {len(items)} of {total} items, short of {request.path_qs}")
+        return web.json_response(
+            {**recorded["page"], "total": total, "limit": limit, "offset": offset,
+             "itemSummaries": items[offset:offset + limit]},
+            headers=headers,
+        )
+
+    async def token(request: web.Request):
+        app["tokens_issued"] += 1
+        return web.json_response({
+            "access_token": f"replay-token-{app['tokens_issued']}",
+            "expires_in": 7200,
+            "token_type": "Application Access Token",
+        })
+
+    app = web.Application()
+    app["outcomes"] = outcomes
+    app["tokens_issued"] = 0
+    app.router.add_post(TOKEN_PATH, token)
+    app.router.add_get("/{tail:.*}", search)
+    return app
+
+async def bench(fixtures: dict, requests: int, concurrency: int, cache: bool = True, **faults):
+    """
+    Replay the recorded searches through the eBay client and report throughput and latency.
+
+    Calls go through ``EbayClient.get_json`` with the response cache (unless
+    ``cache`` is false), circuit breakers, hedging and AIMD limit set up as
+    in the worker. Only the call budget is left out, as it needs Postgres.
+    """
+    from ebay_client import EbayClient
+    from adaptive_concurrency import AIMDLimiter
+    from response_cache import ResponseCache
+
+    app = create_replayer(fixtures, **faults)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    client = EbayClient(base_url=f"http://127.0.0.1:{port}", token="replay")
+    client.concurrency = AIMDLimiter()
+    if cache:
+        client.cache = ResponseCache(shared=False)
+    recorded = [(fixture["path"], fixture["params"]) for fixture in fixtures.values()]
+    timings = []
+    failures = Counter()
+    pending = iter(range(requests))
+
+    async def worker():
+        for number in pending:
+            path, params = recorded[number % len(recorded)]
+            started = time.monotonic()
+            try:
+                await client.get_json(path, params)
+                timings.append(time.monotonic() - started)
+            except Exception as e:
+                failures[type(e).__name__] += 1
+
+    try:
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+        timings.sort()
+        print(f"{requests} calls in {elapsed:.2f}s ({requests / elapsed:.0f}/s), {len(timings)} succeeded")
+        if timings:
+            print(
+                f"latency p50 {timings[len(timings) // 2] * 1000:.1f}ms "
+                f"p95 {timings[int(len(timings) * 0.95)] * 1000:.1f}ms "
+                f"p99 {timings[int(len(timings) * 0.99)] * 1000:.1f}ms"
+            )
+        print(f"server outcomes {dict(app['outcomes'])}, client failures {dict(failures)}")
+        print(f"concurrency limit ended at {client.concurrency.snapshot()['limit']}")
+        if client.cache is not None:
+            print(f"cache {client.cache.stats()}")
+        for path, guard in client.guards.items():
+            print(f"endpoint {path} {guard.snapshot()}")
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+def add_fault_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", default="recorded", help="Latency spec, e.g. 0.1, uniform:0.05,0.3, lognormal:0.2,0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered 500/503")
+    parser.add_argument("--burst-every", type=int, default=0, help="Requests per 429 burst cycle (0 disables)")
+    parser.add_argument("--burst-length", type=int, default=0, help="Requests rejected with 429 at the end of each cycle")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, default=0)
+
+def fault_options(args) -> dict:
+    return {
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "burst_every": args.burst_every,
+        "burst_length": args.burst_length,
+        "retry_after": args.retry_after,
+        "seed": args.seed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay eBay API traffic")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="Proxy to eBay and save responses as fixtures")
+    record_parser.add_argument("--upstream", default=os.getenv("EBAY_UPSTREAM_URL", "https://api.ebay.com"))
+    record_parser.add_argument("--fixtures", required=True)
+    record_parser.add_argument("--port", type=int, default=8082)
+    replay_parser = commands.add_parser("replay", help="Serve fixtures with injected faults")
+    replay_parser.add_argument("--fixtures", required=True)
+    replay_parser.add_argument("--port", type=int, default=8083)
+    add_fault_arguments(replay_parser)
+    bench_parser = commands.add_parser("bench", help="Benchmark the eBay client against replayed fixtures")
+    bench_parser.add_argument("--fixtures", required=True)
+    bench_parser.add_argument("--requests", type=int, default=1000)
+    bench_parser.add_argument("--concurrency", type=int, default=50)
+    bench_parser.add_argument("--no-cache", action="store_true", help="Send every call to the replayer instead of the response cache")
+    add_fault_arguments(bench_parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.command != "bench" else logging.WARNING)
+    if args.command == "record":
+        web.run_app(create_recorder(args.upstream, args.fixtures), port=args.port)
+        return
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        parser.error(f"no fixtures in {args.fixtures}")
+    if args.command == "replay":
+        logger.info(f"Replaying {len(fixtures)} recorded requests")
+        web.run_app(create_replayer(fixtures, **fault_options(args)), port=args.port)
+    else:
+        asyncio.run(bench(fixtures, args.requests, args.concurrency, not args.no_cache, **fault_options(args)))
+
+if __name__ == "__main__":
+    main()
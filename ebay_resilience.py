@@ -0,0 +1,217 @@
+"""
+Circuit breaking and hedged requests for eBay API calls.
+
+Each endpoint gets a circuit breaker. Once EBAY_BREAKER_FAILURE_RATIO of
+its last EBAY_BREAKER_WINDOW calls failed (timeouts, connection errors,
+5xx or 429), it opens and calls fail immediately with EbayCircuitOpen
+instead of each waiting out its timeout. After EBAY_BREAKER_OPEN_SECONDS a
+single probe call is let through; success closes the breaker, failure
+reopens it for twice as long (up to EBAY_BREAKER_MAX_OPEN_SECONDS).
+
+With hedging enabled, a call still running after the endpoint's recent p95
+latency gets a duplicate, and whichever answers first wins. Hedges are
+limited to EBAY_HEDGE_BUDGET of calls so a slow eBay is not sent double
+the traffic.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+EBAY_BREAKER_WINDOW = int(os.getenv("EBAY_BREAKER_WINDOW", "20"))
+EBAY_BREAKER_MIN_CALLS = int(os.getenv("EBAY_BREAKER_MIN_CALLS", "10"))
+EBAY_BREAKER_FAILURE_RATIO = float(os.getenv("EBAY_BREAKER_FAILURE_RATIO", "0.5"))
+EBAY_BREAKER_OPEN_SECONDS = float(os.getenv("EBAY_BREAKER_OPEN_SECONDS", "15"))
+EBAY_BREAKER_MAX_OPEN_SECONDS = float(os.getenv("EBAY_BREAKER_MAX_OPEN_SECONDS", "120"))
+EBAY_HEDGE_ENABLED = os.getenv("EBAY_HEDGE_ENABLED", "true").lower() == "true"
+EBAY_HEDGE_BUDGET = float(os.getenv("EBAY_HEDGE_BUDGET", "0.05"))
+EBAY_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("EBAY_HEDGE_MIN_DELAY_SECONDS", "0.1"))
+
+# Latency samples kept per endpoint for the hedge delay
+LATENCY_SAMPLES = 200
+MIN_LATENCY_SAMPLES = 20
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class EbayCircuitOpen(Exception):
+    """An endpoint's circuit breaker is open; ``retry_after`` is in seconds."""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"eBay endpoint {endpoint} is failing, circuit open for another {retry_after:.0f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """Whether an error says the endpoint is unhealthy, as opposed to a bad request."""
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ClientError)):
+        return True
+    # EbayAPIError and subclasses carry the HTTP status
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        return status >= 500 or status == 429
+    return False
+
+class CircuitBreaker:
+    """Failure-ratio circuit breaker for one endpoint."""
+
+    def __init__(
+        self,
+        endpoint: str,
+        window: int = EBAY_BREAKER_WINDOW,
+        min_calls: int = EBAY_BREAKER_MIN_CALLS,
+        failure_ratio: float = EBAY_BREAKER_FAILURE_RATIO,
+        open_seconds: float = EBAY_BREAKER_OPEN_SECONDS,
+    ):
+        self.endpoint = endpoint
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.base_open_seconds = open_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened = 0
+        self._outcomes = deque(maxlen=window)
+        self._open_until = 0.0
+        self._probing = False
+
+    def before_call(self):
+        """Raise EbayCircuitOpen unless a call may go out now."""
+        if self.state == CLOSED:
+            return
+        now = time.monotonic()
+        if self.state == OPEN and now >= self._open_until:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            logger.info(f"Probing eBay endpoint {self.endpoint}")
+            return
+        raise EbayCircuitOpen(self.endpoint, max(0.0, self._open_until - now))
+
+    def record(self, ok: bool):
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if ok:
+                logger.info(f"eBay endpoint {self.endpoint} recovered, closing circuit")
+                self.state = CLOSED
+                self.open_seconds = self.base_open_seconds
+                self._outcomes.clear()
+            else:
+                self.open_seconds = min(self.open_seconds * 2, EBAY_BREAKER_MAX_OPEN_SECONDS)
+                self._open()
+            return
+        self._outcomes.append(ok)
+        failures = self._outcomes.count(False)
+        if (
+            self.state == CLOSED
+            and len(self._outcomes) >= self.min_calls
+            and failures >= self.failure_ratio * len(self._outcomes)
+        ):
+            self._open()
+
+    def release_probe(self):
+        """Let another probe through after one ended without a verdict (e.g. cancelled)."""
+        self._probing = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened += 1
+        self._open_until = time.monotonic() + self.open_seconds
+        logger.warning(f"eBay endpoint {self.endpoint} failing, opening circuit for {self.open_seconds:.0f}s")
+
+class EndpointGuard:
+    """Circuit breaker, latency tracking and hedging for calls to one endpoint."""
+
+    def __init__(self, endpoint: str, hedge: bool = EBAY_HEDGE_ENABLED, hedge_budget: float = EBAY_HEDGE_BUDGET):
+        self.endpoint = endpoint
+        self.breaker = CircuitBreaker(endpoint)
+        self.hedge = hedge
+        self.hedge_budget = hedge_budget
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def hedge_delay(self):
+        """The recent p95 latency, or None while there are too few samples to trust it."""
+        if len(self._latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return max(ordered[int(len(ordered) * 0.95) - 1], EBAY_HEDGE_MIN_DELAY_SECONDS)
+
+    def _may_hedge(self) -> bool:
+        return self.hedges < self.hedge_budget * self.calls
+
+    async def call(self, fetch):
+        """
+        Run ``fetch()`` through the breaker, hedging it if it runs past p95.
+
+        Raises:
+            EbayCircuitOpen: without calling ``fetch`` while the circuit is open
+        """
+        self.breaker.before_call()
+        self.calls += 1
+        if self.calls >= 10000:
+            # Keep the hedge budget about recent traffic
+            self.calls //= 2
+            self.hedges //= 2
+        started = time.monotonic()
+        verdict = None
+        try:
+            result = await self._hedged(fetch)
+            verdict = True
+            self._latencies.append(time.monotonic() - started)
+            return result
+        except Exception as e:
+            if is_endpoint_failure(e):
+                verdict = False
+            raise
+        finally:
+            if verdict is None:
+                self.breaker.release_probe()
+            else:
+                self.breaker.record(verdict)
+
+    async def _hedged(self, fetch):
+        delay = self.hedge_delay() if self.hedge else None
+        primary = asyncio.ensure_future(fetch())
+        if delay is None:
+            return await primary
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self._may_hedge():
+                self.hedges += 1
+                tasks.add(asyncio.ensure_future(fetch()))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def snapshot(self) -> dict:
+        delay = self.hedge_delay()
+        return {
+            "state": self.breaker.state,
+            "times_opened": self.breaker.opened,
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay_seconds": round(delay, 3) if delay is not None else None,
+        }
@@ -0,0 +1,184 @@
+"""
+Tier-weighted fair queue in front of the eBay fetch stage.
+
+Due fetch groups wait in one FIFO per subscription tier and are handed to
+the fetch workers by deficit round robin, so when the scheduler falls
+behind each tier still gets its configured share of fetch capacity. A tier
+with a wait target (PREMIUM by default) jumps the round robin as soon as
+its oldest group has waited that long. The queue records how long groups
+waited per tier so the target can be checked.
+"""
+
+import logging
+import os
+from collections import deque
+
+from fetch_groups import group_by_fetch_key
+from models import SubscriptionTier
+
+logger = logging.getLogger(__name__)
+
+# Highest tier first; a group shared by several users takes its best tier
+TIER_ORDER = (SubscriptionTier.PREMIUM, SubscriptionTier.BASIC, SubscriptionTier.FREE)
+TIER_RANK = {tier: rank for rank, tier in enumerate(TIER_ORDER)}
+
+WAIT_SAMPLE_SIZE = 1000
+
+def parse_tier_values(value: str) -> dict:
+    """Parse "premium=6,basic=3,free=1" into a {SubscriptionTier: float} dict."""
+    values = {}
+    for part in (value or "").split(","):
+        if not part.strip():
+            continue
+        name, _, number = part.partition("=")
+        values[SubscriptionTier(name.strip().lower())] = float(number)
+    return values
+
+TIER_WEIGHTS = parse_tier_values(os.getenv("SCHEDULER_TIER_WEIGHTS", "premium=6,basic=3,free=1"))
+TIER_WAIT_TARGETS = parse_tier_values(os.getenv("SCHEDULER_TIER_WAIT_TARGETS", "premium=60"))
+
+def group_tier(searches):
+    """Return the best subscription tier among a group's searches."""
+    return min((search.subscription_tier for search in searches), key=lambda tier: TIER_RANK.get(tier, len(TIER_ORDER)))
+
+def percentile(values, fraction: float):
+    """Return the value at ``fraction`` of a list, nearest rank."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class TierFairQueue:
+    """Per-tier FIFOs of fetch groups drained by deficit round robin."""
+
+    def __init__(self, weights: dict = None, wait_targets: dict = None):
+        self.weights = weights or TIER_WEIGHTS
+        self.wait_targets = wait_targets if wait_targets is not None else TIER_WAIT_TARGETS
+        self._queues = {tier: deque() for tier in TIER_ORDER}
+        self._entries = {}
+        self._deficits = {tier: 0.0 for tier in TIER_ORDER}
+        self._turn = 0
+        self._waits = {tier: deque(maxlen=WAIT_SAMPLE_SIZE) for tier in TIER_ORDER}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def search_count(self) -> int:
+        return sum(len(entry[1]) for entry in self._entries.values())
+
+    def searches(self):
+        """Return every queued search."""
+        return [search for entry in self._entries.values() for search in entry[1]]
+
+    def search_ids(self):
+        """Return the ids of every queued search."""
+        return [search.id for search in self.searches()]
+
+    def depth(self) -> dict:
+        """Return the number of queued groups per tier."""
+        return {tier: len(queue) for tier, queue in self._queues.items()}
+
+    def add(self, searches, now):
+        """
+        Queue due searches, joining any group with the same fetch key that is still waiting.
+
+        A group's wait is measured from the earliest due time among its
+        searches, so time spent waiting to be claimed counts too. A search
+        of a better tier joining a waiting group moves the group to that
+        tier's queue, at its place by wait, keeping when it was queued.
+        """
+        for key, members in group_by_fetch_key(searches).items():
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1].extend(members)
+                tier = group_tier(entry[1])
+                if tier != entry[3]:
+                    self._queues[entry[3]].remove(key)
+                    self._requeue(key, entry[2], tier)
+                    entry[3] = tier
+                continue
+            tier = group_tier(members)
+            ready_at = min((search.next_due_at for search in members), default=now)
+            self._entries[key] = [key, list(members), min(ready_at, now), tier]
+            self._queues[tier].append(key)
+
+    def _requeue(self, key, enqueued_at, tier):
+        queue = self._queues[tier]
+        index = len(queue)
+        while index and self._entries[queue[index - 1]][2] > enqueued_at:
+            index -= 1
+        queue.insert(index, key)
+
+    def _pop(self, tier, now, taken):
+        key = self._queues[tier].popleft()
+        _, members, enqueued_at, _ = self._entries.pop(key)
+        self._waits[tier].append((now - enqueued_at).total_seconds())
+        taken[key] = members
+
+    def take(self, limit: int, now):
+        """
+        Dequeue up to ``limit`` groups for the fetch stage.
+
+        Groups past their tier's wait target go first, then the remaining
+        capacity is shared by deficit round robin with each tier's weight as
+        its quantum.
+
+        Returns:
+            Dict mapping fetch key to the searches in that group, in dispatch order
+        """
+        taken = {}
+        for tier in TIER_ORDER:
+            target = self.wait_targets.get(tier)
+            if target is None:
+                continue
+            queue = self._queues[tier]
+            while queue and len(taken) < limit:
+                if (now - self._entries[queue[0]][2]).total_seconds() < target:
+                    break
+                self._pop(tier, now, taken)
+
+        while len(taken) < limit and self._entries:
+            tier = TIER_ORDER[self._turn]
+            queue = self._queues[tier]
+            if not queue:
+                self._deficits[tier] = 0.0
+                self._turn = (self._turn + 1) % len(TIER_ORDER)
+                continue
+            if self._deficits[tier] < 1:
+                self._deficits[tier] += max(self.weights.get(tier, 1.0), 0.01)
+            while queue and self._deficits[tier] >= 1 and len(taken) < limit:
+                self._pop(tier, now, taken)
+                self._deficits[tier] -= 1
+            if not queue:
+                self._deficits[tier] = 0.0
+            if not queue or self._deficits[tier] < 1:
+                self._turn = (self._turn + 1) % len(TIER_ORDER)
+        return taken
+
+    def wait_summary(self) -> dict:
+        """Return p50/p95/max queue wait in seconds and current depth per tier."""
+        depth = self.depth()
+        summary = {}
+        for tier in TIER_ORDER:
+            waits = list(self._waits[tier])
+            summary[tier.value] = {
+                "queued": depth[tier],
+                "p50": percentile(waits, 0.5),
+                "p95": percentile(waits, 0.95),
+                "max": max(waits) if waits else 0.0,
+                "target": self.wait_targets.get(tier),
+            }
+        return summary
+
+    def log_waits(self):
+        """Log per-tier queue wait, warning when a tier's p95 misses its target."""
+        for tier, stats in self.wait_summary().items():
+            message = (
+                f"Tier {tier}: {stats['queued']} groups queued, wait p50 {stats['p50']:.1f}s "
+                f"p95 {stats['p95']:.1f}s max {stats['max']:.1f}s"
+            )
+            if stats["target"] is not None and stats["p95"] > stats["target"]:
+                logger.warning(f"{message} (target {stats['target']:.0f}s missed)")
+            else:
+                logger.info(message)
@@ -0,0 +1,241 @@
+"""
+Local stand-in for the eBay Browse API, for trying the scheduler and
+benchmarking the eBay client without touching eBay.
+
+Serves ``/buy/browse/v1/item_summary/search`` with deterministic listings
+per query, ``/buy/browse/v1/item/`` (getItems) for any item number, and
+``/identity/v1/oauth2/token`` with fake application tokens. Every
+``--new-every`` seconds a few new listings appear at the top, so the
+scheduler sees a steady trickle of new items. ``--latency`` adds a fixed
+delay to each response.
+
+Usage:
+    python fake_ebay_server.py serve --port 8081
+    EBAY_API_BASE_URL=http://localhost:8081 python worker.py
+
+    python fake_ebay_server.py bench --requests 500 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import time
+from functools import lru_cache
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SIZE = 1000
+NEW_PER_TICK = 3
+
+def query_seed(query: str) -> int:
+    return int.from_bytes(hashlib.blake2b(query.encode(), digest_size=4).digest(), "big")
+
+def make_item(query: str, number: int, tick: int) -> dict:
+    """Build one Browse API item summary; ``number`` is unique per query."""
+    item_number = 100000000000 + query_seed(query) % 100000 * 100000 + number
+    price = 5 + (item_number * 7919) % 99500 / 100
+    return {
+        "itemId": f"v1|{item_number}|0",
+        "legacyItemId": str(item_number),
+        "title": f"{query} #{number}",
+        "price": {"value": f"{price:.2f}", "currency": "USD"},
+        "itemWebUrl": f"https://www.ebay.com/itm/{item_number}",
+        "buyingOptions": ["AUCTION"] if number % 3 == 0 else ["FIXED_PRICE"],
+        "itemLocation": {"postalCode": "941**", "country": "GB" if number % 5 == 0 else "US"},
+        "itemCreationDate": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(tick)),
+        "itemEndDate": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(tick + 7 * 86400)),
+        # Fields real responses carry that the alert pipeline ignores
+        "itemHref": f"https://api.ebay.com/buy/browse/v1/item/v1%7C{item_number}%7C0",
+        "itemAffiliateWebUrl": f"https://www.ebay.com/itm/{item_number}?mkevt=1&mkcid=1&mkrid=711-53200-19255-0",
+        "image": {"imageUrl": f"https://i.ebayimg.com/images/g/{item_number}/s-l225.jpg"},
+        "thumbnailImages": [{"imageUrl": f"https://i.ebayimg.com/images/g/{item_number}/s-l1600.jpg"}],
+        "seller": {"username": f"seller{number % 97}", "feedbackPercentage": "99.6", "feedbackScore": 1200 + number},
+        "condition": "Used",
+        "conditionId": "3000",
+        "categories": [{"categoryId": "139971", "categoryName": "Video Game Consoles"}],
+        "leafCategoryIds": ["139971"],
+        "shippingOptions": [
+            {"shippingCostType": "FIXED", "shippingCost": {"value": "9.99", "currency": "USD"}},
+        ],
+        "adultOnly": False,
+        "priorityListing": False,
+        "topRatedBuyingExperience": number % 4 == 0,
+    }
+
+def make_item_detail(item_number: int, now: float) -> dict:
+    """Build a getItems item for any item number; auctions gain a bid every ten minutes."""
+    created = now - item_number % 86400
+    price = 5 + (item_number * 7919) % 99500 / 100
+    item = {
+        "itemId": f"v1|{item_number}|0",
+        "legacyItemId": str(item_number),
+        "title": f"Item {item_number}",
+        "price": {"value": f"{price:.2f}", "currency": "USD"},
+        "itemWebUrl": f"https://www.ebay.com/itm/{item_number}",
+        "buyingOptions": ["AUCTION"] if item_number % 3 == 0 else ["FIXED_PRICE"],
+        "itemLocation": {"postalCode": "941**", "country": "US"},
+        "itemCreationDate": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(created)),
+        "itemEndDate": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(created + (item_number % 7 + 1) * 86400)),
+    }
+    if item_number % 3 == 0:
+        bids = int(now - created) // 600
+        item["currentBidPrice"] = {"value": f"{price + bids * 0.5:.2f}", "currency": "USD"}
+    return item
+
+def parse_filter(value: str) -> dict:
+    """Split a Browse ``filter`` string into {name: value}, keeping commas inside brackets."""
+    filters = {}
+    depth = 0
+    start = 0
+    for index, char in enumerate(value + ","):
+        if char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth -= 1
+        elif char == "," and depth == 0:
+            name, _, field = value[start:index].partition(":")
+            if name:
+                filters[name.strip()] = field.strip()
+            start = index + 1
+    return filters
+
+def matches(item: dict, filters: dict) -> bool:
+    price_range = filters.get("price")
+    if price_range:
+        low, _, high = price_range.strip("[]").partition("..")
+        price = float(item["price"]["value"])
+        if (low and price < float(low)) or (high and price > float(high)):
+            return False
+    buying = filters.get("buyingOptions")
+    if buying and buying.strip("{}") not in item["buyingOptions"]:
+        return False
+    country = filters.get("itemLocationCountry")
+    if country and item["itemLocation"]["country"] != country:
+        return False
+    return True
+
+def create_app(
+    latency: float = 0.0,
+    new_every: float = 60.0,
+    start: float = None,
+    token_ttl: int = 7200,
+) -> web.Application:
+    """Build the fake API. Listings for a query grow by NEW_PER_TICK every ``new_every`` seconds."""
+    started = start if start is not None else time.time()
+
+    @lru_cache(maxsize=256)
+    def listings_for(query: str, newest: int):
+        # Newest first, like sort=newlyListed
+        return [
+            make_item(query, number, int(started + max(0, number - CATALOG_SIZE) // NEW_PER_TICK * new_every))
+            for number in range(newest, 0, -1)
+        ]
+
+    async def search(request: web.Request):
+        if latency:
+            await asyncio.sleep(latency)
+        query = request.query.get("q", "")
+        limit = min(int(request.query.get("limit", "50")), 200)
+        offset = int(request.query.get("offset", "0"))
+        filters = parse_filter(request.query.get("filter", ""))
+        ticks = int((time.time() - started) / new_every) if new_every else 0
+        newest = CATALOG_SIZE + ticks * NEW_PER_TICK
+        items = [item for item in listings_for(query, newest) if matches(item, filters)]
+        page = items[offset:offset + limit]
+        return web.json_response({
+            "total": len(items),
+            "limit": limit,
+            "offset": offset,
+            "itemSummaries": page,
+        })
+
+    async def items(request: web.Request):
+        if latency:
+            await asyncio.sleep(latency)
+        app["item_calls"] += 1
+        numbers = [int(item_id.split("|")[1]) for item_id in request.query.get("item_ids", "").split(",") if item_id]
+        if len(numbers) > 20:
+            return web.json_response({"errors": [{"message": "at most 20 item_ids"}]}, status=400)
+        # Every eleventh item has been removed
+        found = [make_item_detail(number, time.time()) for number in numbers if number % 11]
+        if not found:
+            return web.json_response({"errors": [{"errorId": 11001, "message": "items not found"}]}, status=404)
+        return web.json_response({"items": found})
+
+    async def token(request: web.Request):
+        if latency:
+            await asyncio.sleep(latency)
+        app["tokens_issued"] += 1
+        return web.json_response({
+            "access_token": f"fake-token-{app['tokens_issued']}",
+            "expires_in": token_ttl,
+            "token_type": "Application Access Token",
+        })
+
+    app = web.Application()
+    app["tokens_issued"] = 0
+    app["item_calls"] = 0
+    app.router.add_get("/buy/browse/v1/item_summary/search", search)
+    app.router.add_get("/buy/browse/v1/item/", items)
+    app.router.add_post("/identity/v1/oauth2/token", token)
+    return app
+
+async def bench(requests: int, concurrency: int, latency: float):
+    """Time searches through the pooled client against an in-process fake server."""
+    from ebay_client import EbayClient
+    from fetch_groups import FetchKey
+
+    runner = web.AppRunner(create_app(latency=latency))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    client = EbayClient(base_url=f"http://127.0.0.1:{port}", token="fake")
+    timings = []
+    pending = iter(range(requests))
+
+    async def worker():
+        for number in pending:
+            key = FetchKey(query=f"query {number % 50}", listing_type="all", locations="")
+            started = time.monotonic()
+            await client.search(key, 10, 500)
+            timings.append(time.monotonic() - started)
+
+    try:
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+        timings.sort()
+        print(f"{requests} searches in {elapsed:.2f}s ({requests / elapsed:.0f}/s)")
+        print(
+            f"latency p50 {timings[len(timings) // 2] * 1000:.1f}ms "
+            f"p95 {timings[int(len(timings) * 0.95)] * 1000:.1f}ms"
+        )
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the eBay Browse API")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="Run the fake API")
+    serve_parser.add_argument("--port", type=int, default=8081)
+    serve_parser.add_argument("--latency", type=float, default=0.0, help="Seconds to delay each response")
+    serve_parser.add_argument("--new-every", type=float, default=60.0, help="Seconds between new listings")
+    bench_parser = commands.add_parser("bench", help="Benchmark the pooled eBay client against the fake API")
+    bench_parser.add_argument("--requests", type=int, default=500)
+    bench_parser.add_argument("--concurrency", type=int, default=20)
+    bench_parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        logging.basicConfig(level=logging.INFO)
+        web.run_app(create_app(args.latency, args.new_every), port=args.port)
+    else:
+        asyncio.run(bench(args.requests, args.concurrency, args.latency))
+
+if __name__ == "__main__":
+    main()
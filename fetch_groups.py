@@ -0,0 +1,95 @@
+"""
+Group saved searches that can be served by a single eBay fetch.
+
+Searches that share the same normalized query, listing type and locations
+only differ in their price window, so the scheduler fetches once per group
+and applies each subscriber's price filter in memory. Locations are
+normalized to ISO country codes, the form eBay filters on.
+"""
+
+import hashlib
+import logging
+from collections import namedtuple
+
+from country_codes import parse_locations
+from models import ListingType
+
+logger = logging.getLogger(__name__)
+
+FetchKey = namedtuple("FetchKey", ["query", "listing_type", "locations"])
+
+def normalize_query(query: str) -> str:
+    """Lowercase the query and collapse runs of whitespace."""
+    return " ".join((query or "").lower().split())
+
+# Unmappable location entries already warned about, so each is logged once
+_unmapped_warned = set()
+
+def normalize_locations(locations: str) -> str:
+    """
+    Return a canonical, order-independent list of ISO country codes for a location list.
+
+    Entries that are not a recognizable country are left out, with a
+    warning, rather than sent to eBay as an invalid filter.
+    """
+    if not locations:
+        return ""
+    codes, unmapped = parse_locations(locations)
+    for entry in unmapped:
+        if entry not in _unmapped_warned:
+            _unmapped_warned.add(entry)
+            logger.warning(f"Ignoring saved search location {entry!r}: not a known country")
+    return ",".join(codes)
+
+def fetch_key(search) -> FetchKey:
+    """Build the fetch key for a saved search row."""
+    listing_type = search.listing_type or ListingType.ALL
+    if isinstance(listing_type, ListingType):
+        listing_type = listing_type.value
+    return FetchKey(
+        query=normalize_query(search.search_query),
+        listing_type=listing_type,
+        locations=normalize_locations(search.locations),
+    )
+
+def fetch_key_id(key: FetchKey) -> str:
+    """Return a short stable identifier for a fetch key, used as a storage key."""
+    raw = "\x1f".join((key.query, key.listing_type, key.locations))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def group_by_fetch_key(searches):
+    """Group saved searches by fetch key, preserving the order they were given in."""
+    groups = {}
+    for search in searches:
+        groups.setdefault(fetch_key(search), []).append(search)
+    return groups
+
+def price_window(searches):
+    """
+    Return the (min_price, max_price) window covering every search in a group.
+
+    A bound is None when any member leaves it open, so the shared fetch never
+    drops a listing that one of the subscribers would want.
+    """
+    mins = [s.min_price for s in searches]
+    maxes = [s.max_price for s in searches]
+    low = None if any(p is None for p in mins) else min(mins)
+    high = None if any(p is None for p in maxes) else max(maxes)
+    return low, high
+
+def price_matches(price, min_price, max_price) -> bool:
+    """Check a listing price against a search's optional price bounds."""
+    if price is None:
+        return min_price is None and max_price is None
+    if min_price is not None and price < min_price:
+        return False
+    if max_price is not None and price > max_price:
+        return False
+    return True
+
+def filter_for_search(listings, search):
+    """Return the listings from a shared fetch that fall inside one search's price window."""
+    return [
+        listing for listing in listings
+        if price_matches(listing.price, search.min_price, search.max_price)
+    ]
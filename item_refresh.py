@@ -0,0 +1,232 @@
+"""
+Batched refresh of price and end time for tracked eBay listings.
+
+Users track listings they were alerted about (``tracked_listings``), and
+the latest known state of each listing is kept once in ``item_details``
+however many users track it. Each item carries its own ``refresh_due_at``:
+an auction close to its end goes stale within minutes, one ending next
+week or a fixed-price listing can go hours between refreshes (see
+``staleness_seconds``). Each round claims due items with ``FOR UPDATE SKIP
+LOCKED``, so workers never refresh the same item twice, and fetches them
+ITEM_BATCH_SIZE at a time with getItems: one eBay call per batch rather
+than one per item per user.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import bindparam, delete, exists, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database_config import AsyncSessionLocal
+from ebay_client import ITEMS_BATCH_LIMIT, get_ebay_client
+from ebay_listings import parse_timestamp
+from models import ItemDetail, TrackedListing
+
+logger = logging.getLogger(__name__)
+
+ITEM_BATCH_SIZE = max(1, min(int(os.getenv("ITEM_BATCH_SIZE", str(ITEMS_BATCH_LIMIT))), ITEMS_BATCH_LIMIT))
+ITEM_REFRESH_POLL_SECONDS = float(os.getenv("ITEM_REFRESH_POLL_SECONDS", "60"))
+# Upper bound on getItems calls per round, so item refreshes never starve searches of quota
+ITEM_REFRESH_MAX_BATCHES = int(os.getenv("ITEM_REFRESH_MAX_BATCHES", "25"))
+ITEM_REFRESH_LEASE_SECONDS = int(os.getenv("ITEM_REFRESH_LEASE_SECONDS", "300"))
+# An auction may go this fraction of its remaining time between refreshes
+ITEM_STALENESS_FRACTION = float(os.getenv("ITEM_STALENESS_FRACTION", "0.1"))
+ITEM_MIN_STALENESS_SECONDS = float(os.getenv("ITEM_MIN_STALENESS_SECONDS", "120"))
+ITEM_MAX_STALENESS_SECONDS = float(os.getenv("ITEM_MAX_STALENESS_SECONDS", "21600"))
+
+def staleness_seconds(buying_option, end_time, now: datetime):
+    """
+    How old an item's cached state may get before it is refreshed.
+
+    Returns:
+        Seconds, or None once the item has ended and needs no more refreshes
+    """
+    if end_time is None:
+        return ITEM_MAX_STALENESS_SECONDS
+    remaining = (end_time - now).total_seconds()
+    if remaining <= 0:
+        return None
+    if buying_option == "AUCTION":
+        # Bids pile up towards the end, so refresh more often as it nears
+        bound = remaining * ITEM_STALENESS_FRACTION
+    else:
+        bound = ITEM_MAX_STALENESS_SECONDS
+    bound = max(ITEM_MIN_STALENESS_SECONDS, min(bound, ITEM_MAX_STALENESS_SECONDS))
+    # Never sleep through the end: the next refresh picks up the final price
+    return min(bound, remaining + ITEM_MIN_STALENESS_SECONDS)
+
+def next_refresh(buying_option, end_time, now: datetime):
+    """When an item refreshed at ``now`` is next due, or None if never."""
+    seconds = staleness_seconds(buying_option, end_time, now)
+    return now + timedelta(seconds=seconds) if seconds is not None else None
+
+async def track_listings(session: AsyncSession, user_id: int, listings, saved_search_id: int = None, now: datetime = None):
+    """
+    Start tracking ``listings`` for a user, e.g. when alerting them.
+
+    The Listing records just came from a search, so they seed the shared
+    item state and the first refresh is only due once that goes stale.
+    Does not commit.
+    """
+    listings = list(listings)
+    if not listings:
+        return
+    now = now or datetime.now(timezone.utc)
+    await session.execute(
+        insert(TrackedListing)
+        .values([
+            {"user_id": user_id, "item_number": listing.number, "saved_search_id": saved_search_id}
+            for listing in listings
+        ])
+        .on_conflict_do_nothing()
+    )
+    details = []
+    for listing in listings:
+        end_time = parse_timestamp(listing.end_time)
+        details.append({
+            "item_number": listing.number,
+            "item_id": listing.item_id or f"v1|{listing.number}|0",
+            "price": listing.price,
+            "currency": listing.currency,
+            "buying_option": listing.buying_option,
+            "end_time": end_time,
+            "status": "active",
+            "refreshed_at": now,
+            "refresh_due_at": next_refresh(listing.buying_option, end_time, now),
+        })
+    await session.execute(insert(ItemDetail).values(details).on_conflict_do_nothing())
+
+async def untrack_listing(session: AsyncSession, user_id: int, item_number: int):
+    """Stop tracking an item for a user; its shared state goes once nobody tracks it. Does not commit."""
+    await session.execute(
+        delete(TrackedListing).where(TrackedListing.user_id == user_id, TrackedListing.item_number == item_number)
+    )
+    still_tracked = exists().where(TrackedListing.item_number == item_number)
+    await session.execute(delete(ItemDetail).where(ItemDetail.item_number == item_number, ~still_tracked))
+
+async def claim_due_items(session: AsyncSession, now: datetime, limit: int):
+    """
+    Claim up to ``limit`` tracked items whose cached state is stale, most overdue first.
+
+    Claimed items are pushed ITEM_REFRESH_LEASE_SECONDS into the future so
+    other workers pass over them; a successful refresh sets the real next
+    due time. Commits to release the row locks.
+
+    Returns:
+        List of (item_number, item_id) rows
+    """
+    claimable = (
+        select(ItemDetail.item_number)
+        .where(
+            ItemDetail.refresh_due_at <= now,
+            exists().where(TrackedListing.item_number == ItemDetail.item_number),
+        )
+        .order_by(ItemDetail.refresh_due_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        update(ItemDetail)
+        .where(ItemDetail.item_number.in_(claimable))
+        .values(refresh_due_at=now + timedelta(seconds=ITEM_REFRESH_LEASE_SECONDS))
+        .returning(ItemDetail.item_number, ItemDetail.item_id)
+        .execution_options(synchronize_session=False)
+    )
+    claimed = result.all()
+    await session.commit()
+    return claimed
+
+def refreshed_values(listing, now: datetime) -> dict:
+    end_time = parse_timestamp(listing.end_time)
+    return {
+        "b_item_number": listing.number,
+        "b_price": listing.price,
+        "b_currency": listing.currency,
+        "b_buying_option": listing.buying_option,
+        "b_end_time": end_time,
+        "b_status": "ended" if end_time is not None and end_time <= now else "active",
+        "b_refreshed_at": now,
+        "b_refresh_due_at": next_refresh(listing.buying_option, end_time, now),
+    }
+
+async def save_refreshed(session: AsyncSession, listings, missing, now: datetime):
+    """Store refreshed item state and mark items eBay no longer returns as unavailable. Commits."""
+    if listings:
+        await session.execute(
+            update(ItemDetail.__table__)
+            .where(ItemDetail.__table__.c.item_number == bindparam("b_item_number"))
+            .values(
+                price=bindparam("b_price"),
+                currency=bindparam("b_currency"),
+                buying_option=bindparam("b_buying_option"),
+                end_time=bindparam("b_end_time"),
+                status=bindparam("b_status"),
+                refreshed_at=bindparam("b_refreshed_at"),
+                refresh_due_at=bindparam("b_refresh_due_at"),
+            ),
+            [refreshed_values(listing, now) for listing in listings],
+        )
+    if missing:
+        await session.execute(
+            update(ItemDetail)
+            .where(ItemDetail.item_number.in_(missing))
+            .values(status="unavailable", refreshed_at=now, refresh_due_at=None)
+        )
+    await session.commit()
+
+async def refresh_batch(batch, now: datetime):
+    """
+    Refresh one batch of claimed (item_number, item_id) rows with a single getItems call.
+
+    Returns:
+        Number of items eBay still had
+    """
+    listings = await get_ebay_client().get_items([item_id for _, item_id in batch])
+    found = {listing.number for listing in listings}
+    missing = [item_number for item_number, _ in batch if item_number not in found]
+    async with AsyncSessionLocal() as session:
+        await save_refreshed(session, listings, missing, now)
+    return len(listings)
+
+async def refresh_tracked_items(now: datetime = None, max_batches: int = ITEM_REFRESH_MAX_BATCHES):
+    """
+    Run one refresh round: claim stale tracked items and refresh them in batches.
+
+    Batches run concurrently; a failed batch keeps its lease and is retried
+    once the lease lapses.
+
+    Returns:
+        Tuple of (items refreshed, eBay calls made)
+    """
+    now = now or datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        claimed = await claim_due_items(session, now, ITEM_BATCH_SIZE * max_batches)
+    if not claimed:
+        return 0, 0
+    batches = [claimed[start:start + ITEM_BATCH_SIZE] for start in range(0, len(claimed), ITEM_BATCH_SIZE)]
+    results = await asyncio.gather(*(refresh_batch(batch, now) for batch in batches), return_exceptions=True)
+    refreshed = 0
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Error refreshing tracked items: {str(result)}")
+        else:
+            refreshed += result
+    logger.info(f"Refreshed {refreshed} of {len(claimed)} stale tracked items in {len(batches)} eBay calls")
+    return refreshed, len(batches)
+
+async def run_item_refresh(stop: asyncio.Event):
+    """Refresh stale tracked items every ITEM_REFRESH_POLL_SECONDS until ``stop`` is set."""
+    while not stop.is_set():
+        try:
+            await refresh_tracked_items()
+        except Exception as e:
+            logger.error(f"Error in tracked item refresh: {str(e)}")
+        try:
+            await asyncio.wait_for(stop.wait(), ITEM_REFRESH_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
@@ -2,8 +2,12 @@
 
 from fastapi import FastAPI
 from auth import router as auth_router
+from metrics_routes import router as metrics_router
 
 app = FastAPI()
 
 # Include the auth routes in the FastAPI application
 app.include_router(auth_router)
+
+# Alert scheduler metrics
+app.include_router(metrics_router)
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database_config import get_async_session
+from dependencies import get_current_user
+from ebay_quota import quota_status
+from worker_metrics import load_worker_metrics
+
+# Operational detail about the whole system, so only for signed-in users
+router = APIRouter(dependencies=[Depends(get_current_user)])
+
+@router.get("/metrics/scheduler")
+async def scheduler_metrics(db: AsyncSession = Depends(get_async_session)):
+    """Alert scheduler lag, throughput, latency and queue depth, as last published by each worker."""
+    return await load_worker_metrics(db, "scheduler")
+
+@router.get("/metrics/ebay-quota")
+async def ebay_quota(db: AsyncSession = Depends(get_async_session)):
+    """Today's eBay call budget across all workers and when it would run out at the current rate."""
+    return await quota_status(db)
+
+@router.get("/metrics/ebay-cache")
+async def ebay_cache(db: AsyncSession = Depends(get_async_session)):
+    """Hit/miss counters of each worker's eBay response cache."""
+    return await load_worker_metrics(db, "ebay_cache")
+
+@router.get("/metrics/ebay-endpoints")
+async def ebay_endpoints(db: AsyncSession = Depends(get_async_session)):
+    """Circuit breaker state, hedging and latency per eBay endpoint for each worker."""
+    return await load_worker_metrics(db, "ebay_endpoints")
+
+@router.get("/metrics/ebay-concurrency")
+async def ebay_concurrency(db: AsyncSession = Depends(get_async_session)):
+    """Each worker's adaptive eBay call limit, in-flight calls and why the limit last changed."""
+    return await load_worker_metrics(db, "ebay_concurrency")
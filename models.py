@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum
+from sqlalchemy import BigInteger, Column, Integer, String, Text, Float, ForeignKey, Date, DateTime, Enum, JSON, LargeBinary
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 import enum
@@ -52,5 +52,93 @@ class SavedSearch(Base):
     # Use Enum for listing type
     listing_type = Column(Enum(ListingType), nullable=False, default=ListingType.ALL)
     
+    # When the alert scheduler should next check this search (indexed so the
+    # scheduler only loads searches that are due)
+    next_due_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+    
+    # When the scheduler last checked this search successfully
+    last_checked_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # Learned polling interval and smoothed new listings per hour
+    poll_interval_seconds = Column(Integer, nullable=True)
+    hit_rate = Column(Float, nullable=False, server_default="0")
+    
+    # Checks failed in a row since the last successful one, for retry backoff
+    failure_count = Column(Integer, nullable=False, server_default="0")
+    
+    # Scheduler worker currently holding this search and when its claim lapses
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    
     # Relationships
     user = relationship("User", back_populates="saved_searches")
+
+class SeenListing(Base):
+    """Compressed set of eBay item numbers already seen for one fetch key."""
+    __tablename__ = "seen_listings"
+
+    fetch_key = Column(String, primary_key=True)
+    item_ids = Column(LargeBinary, nullable=False)
+    item_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+class SchedulerCheckpoint(Base):
+    """Progress of the latest alert scheduler cycle for one worker."""
+    __tablename__ = "scheduler_checkpoints"
+
+    worker_id = Column(String, primary_key=True)
+    cycle_started_at = Column(DateTime(timezone=True), nullable=False)
+    searches_dispatched = Column(Integer, nullable=False, default=0)
+    searches_completed = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+class WorkerMetrics(Base):
+    """Latest metrics snapshot published by one alert worker."""
+    __tablename__ = "worker_metrics"
+
+    worker_id = Column(String, primary_key=True)
+    snapshot = Column(JSON, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+class EbayQuota(Base):
+    """eBay API calls handed out to workers so far in the current quota day."""
+    __tablename__ = "ebay_quota"
+
+    name = Column(String, primary_key=True)
+    day = Column(Date, nullable=False)
+    calls_used = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+class TrackedListing(Base):
+    """An eBay listing a user was alerted about and wants price and end-time updates for."""
+    __tablename__ = "tracked_listings"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    item_number = Column(BigInteger, primary_key=True, index=True)
+    saved_search_id = Column(Integer, ForeignKey("saved_searches.id", ondelete="SET NULL"), nullable=True)
+    tracked_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+class ItemDetail(Base):
+    """Latest known state of a tracked eBay listing, shared by every user tracking it."""
+    __tablename__ = "item_details"
+
+    item_number = Column(BigInteger, primary_key=True)
+    item_id = Column(String, nullable=False)
+    price = Column(Float, nullable=True)
+    currency = Column(String, nullable=True)
+    buying_option = Column(String, nullable=True)
+    end_time = Column(DateTime(timezone=True), nullable=True)
+    # active, ended, or unavailable (eBay no longer returns it)
+    status = Column(String, nullable=False, default="active", server_default="active")
+    refreshed_at = Column(DateTime(timezone=True), nullable=True)
+    # When the cached state gets too stale for this item; NULL once it needs no more refreshes
+    refresh_due_at = Column(DateTime(timezone=True), nullable=True, index=True)
+
+class EbayResponseCache(Base):
+    """Recent eBay API responses shared between processes (UNLOGGED: lost on crash, which is fine for a cache)."""
+    __tablename__ = "ebay_response_cache"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    key = Column(String, primary_key=True)
+    stored_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    body = Column(Text, nullable=False)
@@ -0,0 +1,117 @@
+"""
+Reverse search: match incoming listings against every saved search at once.
+
+Instead of polling eBay once per saved search, a stream of new listings
+can be matched against all searches. Each search is indexed under the
+terms of just one of its required clauses (an eBay query ANDs its
+clauses; an ``(a,b)`` group is one clause with alternatives), chosen to
+be the rarest clause in the index so far. Any title that matches the
+search must contain one of those terms, so looking up a title's tokens in
+the inverted index yields every search that could match, usually only a
+handful, and only those are checked against the full compiled query
+(phrases, exclusions and groups, see ``query_compiler``). Searches with
+nothing required (only exclusions) are candidates for every title.
+
+The percolator can be attached to a SearchCatalog, which keeps it in step
+with search edits.
+"""
+
+from collections import defaultdict
+
+from query_compiler import compile_query, prepare_title
+
+class Percolator:
+    """Inverted index from query terms to the saved searches they anchor."""
+
+    def __init__(self):
+        self._postings = defaultdict(set)
+        self._searches = {}
+        self._match_all = set()
+
+    def __len__(self):
+        return len(self._searches)
+
+    def add(self, search_id: int, query: str):
+        """Index a search, replacing any earlier version of it."""
+        if search_id in self._searches:
+            self.remove(search_id)
+        compiled = compile_query(query)
+        clauses = compiled.anchor_clauses()
+        if clauses:
+            # The clause with the shortest postings keeps candidate lists short
+            anchor = min(clauses, key=lambda clause: (sum(len(self._postings.get(token, ())) for token in clause), len(clause)))
+            for token in anchor:
+                self._postings[token].add(search_id)
+        else:
+            anchor = frozenset()
+            self._match_all.add(search_id)
+        self._searches[search_id] = (anchor, compiled)
+
+    def remove(self, search_id: int):
+        entry = self._searches.pop(search_id, None)
+        if entry is None:
+            return
+        anchor = entry[0]
+        if not anchor:
+            self._match_all.discard(search_id)
+        for token in anchor:
+            postings = self._postings[token]
+            postings.discard(search_id)
+            if not postings:
+                del self._postings[token]
+
+    def clear(self):
+        self._postings.clear()
+        self._searches.clear()
+        self._match_all.clear()
+
+    # SearchCatalog index interface
+    def update(self, definition):
+        self.add(definition.id, definition.search_query)
+
+    def candidates(self, title_tokens):
+        """Ids of searches anchored on any of ``title_tokens``, before verification."""
+        found = set(self._match_all)
+        postings = self._postings
+        for token in title_tokens:
+            anchored = postings.get(token)
+            if anchored:
+                found |= anchored
+        return found
+
+    def match(self, title: str):
+        """
+        Ids of every search whose query matches ``title``.
+
+        Returns:
+            List of saved search ids
+        """
+        tokens, token_set = prepare_title(title)
+        searches = self._searches
+        matched = []
+        for search_id in self.candidates(token_set):
+            if searches[search_id][1].matches(tokens, token_set):
+                matched.append(search_id)
+        return matched
+
+    def match_listings(self, listings):
+        """
+        Group a batch of listings by the searches they match.
+
+        Returns:
+            Dict mapping saved search id to its matching listings
+        """
+        matches = defaultdict(list)
+        for listing in listings:
+            for search_id in self.match(listing.title):
+                matches[search_id].append(listing)
+        return matches
+
+    def stats(self) -> dict:
+        sizes = [len(postings) for postings in self._postings.values()]
+        return {
+            "searches": len(self._searches),
+            "terms": len(sizes),
+            "match_all": len(self._match_all),
+            "largest_posting": max(sizes, default=0),
+        }
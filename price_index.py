@@ -0,0 +1,161 @@
+"""
+Index of saved search price windows for matching listings by price.
+
+Answers "which searches' min_price/max_price window contains this price"
+with one lookup instead of checking every search. The price axis is cut
+into PRICE_INDEX_BINS bins on a log scale (prices from a cent to millions
+are spread evenly by ratio), and a segment tree over the bins stores each
+window under the O(log bins) tree nodes that exactly cover the bins fully
+inside it. A lookup walks from the price's bin to the root collecting
+those, then checks exactly the few windows that start or end inside that
+same bin. Adding, changing or removing a search touches only its own
+O(log bins) nodes, so the index follows edits without rebuilding.
+
+Bounds are optional, like ``fetch_groups.price_matches``: a missing bound
+is open, and a listing without a price only matches searches with neither.
+"""
+
+import math
+import os
+
+from fetch_groups import price_matches
+
+PRICE_INDEX_BINS = 1 << max(4, int(os.getenv("PRICE_INDEX_BIN_BITS", "12")))
+# Prices below the floor share the first bin and above the ceiling the last
+PRICE_INDEX_FLOOR = 0.01
+PRICE_INDEX_CEILING = 10_000_000.0
+
+class PriceIndex:
+    """Segment tree over log-scale price bins holding saved search ids."""
+
+    def __init__(self, bins: int = PRICE_INDEX_BINS, floor: float = PRICE_INDEX_FLOOR, ceiling: float = PRICE_INDEX_CEILING):
+        self.bins = bins
+        self.floor = floor
+        self._log_floor = math.log(floor)
+        # Bin 0 holds everything under the floor, the last bin everything over the ceiling
+        self._log_step = (math.log(ceiling) - self._log_floor) / (bins - 2)
+        self._nodes = {}
+        self._edges = {}
+        self._unbounded = set()
+        self._windows = {}
+
+    def __len__(self):
+        return len(self._windows)
+
+    def bin_for(self, price: float) -> int:
+        if price < self.floor:
+            return 0
+        return min(self.bins - 1, 1 + int((math.log(price) - self._log_floor) / self._log_step))
+
+    def add(self, search_id: int, min_price=None, max_price=None):
+        """Index a search's price window, replacing any earlier one."""
+        if search_id in self._windows:
+            self.remove(search_id)
+        self._windows[search_id] = (min_price, max_price)
+        if min_price is None and max_price is None:
+            self._unbounded.add(search_id)
+            return
+        if min_price is not None and max_price is not None and min_price > max_price:
+            # Matches nothing; kept in _windows so remove() and filter() still know it
+            return
+        low = 0 if min_price is None else self.bin_for(min_price)
+        high = self.bins - 1 if max_price is None else self.bin_for(max_price)
+        # Bins holding a bound are only partly inside the window and need an exact check
+        for edge in {low if min_price is not None else None, high if max_price is not None else None} - {None}:
+            self._edges.setdefault(edge, set()).add(search_id)
+        self._cover(low + (min_price is not None), high - (max_price is not None), search_id, add=True)
+
+    def remove(self, search_id: int):
+        window = self._windows.pop(search_id, None)
+        if window is None:
+            return
+        min_price, max_price = window
+        if min_price is None and max_price is None:
+            self._unbounded.discard(search_id)
+            return
+        if min_price is not None and max_price is not None and min_price > max_price:
+            return
+        low = 0 if min_price is None else self.bin_for(min_price)
+        high = self.bins - 1 if max_price is None else self.bin_for(max_price)
+        for edge in (low, high):
+            edged = self._edges.get(edge)
+            if edged is not None:
+                edged.discard(search_id)
+                if not edged:
+                    del self._edges[edge]
+        self._cover(low + (min_price is not None), high - (max_price is not None), search_id, add=False)
+
+    def _cover(self, first: int, last: int, search_id: int, add: bool):
+        """Add or remove ``search_id`` on the tree nodes exactly covering bins ``first``..``last``."""
+        if first > last:
+            return
+        nodes = self._nodes
+        left = first + self.bins
+        right = last + self.bins + 1
+        while left < right:
+            if left & 1:
+                self._toggle(nodes, left, search_id, add)
+                left += 1
+            if right & 1:
+                right -= 1
+                self._toggle(nodes, right, search_id, add)
+            left >>= 1
+            right >>= 1
+
+    @staticmethod
+    def _toggle(nodes: dict, node: int, search_id: int, add: bool):
+        if add:
+            nodes.setdefault(node, set()).add(search_id)
+            return
+        members = nodes.get(node)
+        if members is not None:
+            members.discard(search_id)
+            if not members:
+                del nodes[node]
+
+    def clear(self):
+        self._nodes.clear()
+        self._edges.clear()
+        self._unbounded.clear()
+        self._windows.clear()
+
+    # SearchCatalog index interface
+    def update(self, definition):
+        self.add(definition.id, definition.min_price, definition.max_price)
+
+    def containing(self, price):
+        """
+        Ids of every search whose price window contains ``price``.
+
+        Returns:
+            Set of saved search ids
+        """
+        found = set(self._unbounded)
+        if price is None:
+            return found
+        nodes = self._nodes
+        position = self.bin_for(price)
+        node = position + self.bins
+        while node:
+            members = nodes.get(node)
+            if members:
+                found |= members
+            node >>= 1
+        windows = self._windows
+        for search_id in self._edges.get(position, ()):
+            if price_matches(price, *windows[search_id]):
+                found.add(search_id)
+        return found
+
+    def filter(self, search_ids, price):
+        """
+        Keep the ``search_ids`` whose window contains ``price``.
+
+        Cheaper than ``containing`` when there are only a few candidates,
+        such as a percolator's keyword matches.
+        """
+        windows = self._windows
+        return [
+            search_id for search_id in search_ids
+            if search_id in windows and price_matches(price, *windows[search_id])
+        ]
@@ -0,0 +1,203 @@
+"""
+Compile eBay keyword queries into reusable title predicates.
+
+eBay ANDs the words of a query and also understands quoted phrases
+(``"game boy"``), exclusions (``-broken``, ``-"for parts"``, ``-(box,case)``)
+and OR groups (``(ds,3ds)``, whose alternatives may be phrases). A word
+that splits into several tokens, such as ``ps-5``, is taken as a phrase.
+
+``compile_query`` parses a query once into a CompiledQuery holding
+lowercased token sets and a KMP automaton per phrase, cached by a hash of
+the normalized query so identical searches share one object. A title is
+tokenized once per listing with ``prepare_title``; checking it against
+each compiled query is then set membership tests and automaton steps over
+the title's tokens, without building any new objects.
+"""
+
+import hashlib
+import os
+import re
+from collections import namedtuple
+
+from fetch_groups import normalize_query
+
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "100000"))
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+CLAUSE_PATTERN = re.compile(r'(-?)(?:"([^"]*)"|\(([^)]*)\)|(\S+))')
+
+PreparedTitle = namedtuple("PreparedTitle", ["tokens", "token_set"])
+
+def tokenize(text: str):
+    """Lowercase word tokens of a title or query."""
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+def prepare_title(title: str) -> PreparedTitle:
+    """Tokenize a listing title once for checking against any number of compiled queries."""
+    tokens = tuple(tokenize(title))
+    return PreparedTitle(tokens, frozenset(tokens))
+
+class Phrase:
+    """KMP automaton over tokens for one quoted phrase."""
+
+    __slots__ = ("tokens", "token_set", "failure")
+
+    def __init__(self, tokens):
+        self.tokens = tuple(tokens)
+        self.token_set = frozenset(self.tokens)
+        failure = [0] * len(self.tokens)
+        state = 0
+        for position in range(1, len(self.tokens)):
+            while state and self.tokens[position] != self.tokens[state]:
+                state = failure[state - 1]
+            if self.tokens[position] == self.tokens[state]:
+                state += 1
+            failure[position] = state
+        self.failure = tuple(failure)
+
+    def found_in(self, tokens, token_set) -> bool:
+        """Whether the phrase occurs in ``tokens``; ``token_set`` rules most titles out without a scan."""
+        if not self.token_set <= token_set:
+            return False
+        phrase = self.tokens
+        failure = self.failure
+        last = len(phrase)
+        state = 0
+        for token in tokens:
+            while state and phrase[state] != token:
+                state = failure[state - 1]
+            if phrase[state] == token:
+                state += 1
+                if state == last:
+                    return True
+        return False
+
+class Group:
+    """An OR group: satisfied by any one of its single tokens or phrases."""
+
+    __slots__ = ("tokens", "phrases")
+
+    def __init__(self, tokens, phrases):
+        self.tokens = frozenset(tokens)
+        self.phrases = tuple(phrases)
+
+    def found_in(self, tokens, token_set) -> bool:
+        if not self.tokens.isdisjoint(token_set):
+            return True
+        for phrase in self.phrases:
+            if phrase.found_in(tokens, token_set):
+                return True
+        return False
+
+def _terms(text: str):
+    """A word or phrase as (single token, None) or (None, Phrase); (None, None) if it has no tokens."""
+    tokens = tokenize(text)
+    if not tokens:
+        return None, None
+    if len(tokens) == 1:
+        return tokens[0], None
+    return None, Phrase(tokens)
+
+class CompiledQuery:
+    """A parsed eBay keyword query, ready to check prepared titles against."""
+
+    __slots__ = ("query", "required", "phrases", "groups", "excluded", "excluded_phrases")
+
+    def __init__(self, query: str):
+        self.query = query
+        required = set()
+        phrases = []
+        groups = []
+        excluded = set()
+        excluded_phrases = []
+        for negated, quoted, group, word in CLAUSE_PATTERN.findall(query or ""):
+            if group:
+                single = []
+                multi = []
+                for alternative in group.split(","):
+                    token, phrase = _terms(alternative)
+                    if token is not None:
+                        single.append(token)
+                    elif phrase is not None:
+                        multi.append(phrase)
+                if not single and not multi:
+                    continue
+                if negated:
+                    excluded.update(single)
+                    excluded_phrases.extend(multi)
+                elif multi:
+                    groups.append(Group(single, multi))
+                elif len(single) == 1:
+                    required.add(single[0])
+                else:
+                    groups.append(Group(single, ()))
+                continue
+            token, phrase = _terms(quoted if quoted else word)
+            if negated:
+                if token is not None:
+                    excluded.add(token)
+                elif phrase is not None:
+                    excluded_phrases.append(phrase)
+            elif token is not None:
+                required.add(token)
+            elif phrase is not None:
+                # A phrase's words are all required, which rules out most titles before the automaton runs
+                required.update(phrase.tokens)
+                phrases.append(phrase)
+        self.required = frozenset(required)
+        self.phrases = tuple(phrases)
+        self.groups = tuple(groups)
+        self.excluded = frozenset(excluded)
+        self.excluded_phrases = tuple(excluded_phrases)
+
+    def __repr__(self):
+        return f"CompiledQuery({self.query!r})"
+
+    def matches(self, tokens, token_set) -> bool:
+        """Whether a prepared title (see ``prepare_title``) satisfies the query."""
+        if not self.required <= token_set:
+            return False
+        if not self.excluded.isdisjoint(token_set):
+            return False
+        for group in self.groups:
+            if not group.found_in(tokens, token_set):
+                return False
+        for phrase in self.phrases:
+            if not phrase.found_in(tokens, token_set):
+                return False
+        for phrase in self.excluded_phrases:
+            if phrase.found_in(tokens, token_set):
+                return False
+        return True
+
+    def matches_title(self, title: str) -> bool:
+        """Convenience for a single check; prepare the title once when checking many queries."""
+        return self.matches(*prepare_title(title))
+
+    def anchor_clauses(self):
+        """
+        Clauses any matching title must satisfy, as sets of tokens one of which must appear.
+
+        Used by the percolator to pick the terms a query is indexed under.
+        """
+        clauses = [frozenset((token,)) for token in self.required]
+        for group in self.groups:
+            clauses.append(group.tokens | frozenset(phrase.tokens[0] for phrase in group.phrases))
+        return clauses
+
+_compiled = {}
+
+def query_hash(query: str) -> bytes:
+    """Cache key for a query: equal for queries differing only in case and spacing."""
+    return hashlib.blake2b(normalize_query(query).encode(), digest_size=16).digest()
+
+def compile_query(query: str) -> CompiledQuery:
+    """Return the compiled form of ``query``, compiling it only on first use."""
+    key = query_hash(query)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        if len(_compiled) >= QUERY_CACHE_MAX_ENTRIES:
+            # Drop the oldest entry; searches holding it keep their own reference
+            del _compiled[next(iter(_compiled))]
+        compiled = _compiled[key] = CompiledQuery(normalize_query(query))
+    return compiled
@@ -0,0 +1,208 @@
+"""
+Short-TTL cache of eBay API responses keyed on the canonical request.
+
+Responses are kept as raw bodies (a parsed page of 200 item summaries is
+several times larger than its JSON) in an in-process LRU holding up to
+EBAY_CACHE_MAX_BYTES of them and, with EBAY_CACHE_SHARED=true, in the
+UNLOGGED ``ebay_response_cache`` table so other workers and the web
+process reuse them too. Callers parse the body on every hit. A response younger than EBAY_CACHE_TTL_SECONDS is
+served as is. One up to EBAY_CACHE_STALE_SECONDS older than that is served
+immediately while a single background fetch refreshes it, unless the caller
+asks for fresh responses only, as scheduler polls do: for them a stale
+response would just repeat what the previous poll saw. Concurrent misses
+for the same request in one process share a single eBay call, so identical
+calls inside the TTL never reach eBay more than once per process (once
+overall with the shared tier, apart from workers missing at the same
+instant).
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+
+from database_config import AsyncSessionLocal
+from models import EbayResponseCache
+
+logger = logging.getLogger(__name__)
+
+EBAY_CACHE_TTL_SECONDS = float(os.getenv("EBAY_CACHE_TTL_SECONDS", "60"))
+EBAY_CACHE_STALE_SECONDS = float(os.getenv("EBAY_CACHE_STALE_SECONDS", "120"))
+# Total size of cached response bodies kept in memory
+EBAY_CACHE_MAX_BYTES = int(os.getenv("EBAY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EBAY_CACHE_SHARED = os.getenv("EBAY_CACHE_SHARED", "false").lower() == "true"
+# How often a worker clears expired rows out of the shared table
+EBAY_CACHE_PURGE_SECONDS = float(os.getenv("EBAY_CACHE_PURGE_SECONDS", "300"))
+
+def cache_key(path: str, params: dict) -> str:
+    """Hash a request path and its parameters, independent of parameter order."""
+    canonical = path + "?" + "&".join(f"{name}={params[name]}" for name in sorted(params))
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+class ResponseCache:
+    """LRU of recent response bodies, bounded by size, with an optional shared Postgres tier."""
+
+    def __init__(
+        self,
+        ttl: float = EBAY_CACHE_TTL_SECONDS,
+        stale: float = EBAY_CACHE_STALE_SECONDS,
+        max_bytes: int = EBAY_CACHE_MAX_BYTES,
+        shared: bool = EBAY_CACHE_SHARED,
+    ):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.counters = {
+            "local_hits": 0,
+            "shared_hits": 0,
+            "stale_hits": 0,
+            "coalesced": 0,
+            "misses": 0,
+            "revalidations": 0,
+            "errors": 0,
+        }
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._inflight = {}
+        self._last_purge = time.monotonic()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, key: str, stored_at: float, body: bytes):
+        self._forget(key)
+        if len(body) > self.max_bytes:
+            return
+        self._entries[key] = (stored_at, body)
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _lookup_local(self, key: str, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry[0] > self.ttl + self.stale:
+            self._forget(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def get_or_fetch(self, key: str, fetch, allow_stale: bool = True):
+        """
+        Return the cached response body for ``key``, calling ``fetch()`` only on a miss.
+
+        Args:
+            key: Canonical request key from ``cache_key``
+            fetch: Coroutine function performing the real call and
+                returning the raw response body
+            allow_stale: Whether a response past the TTL may be served
+                while it is refreshed; if not, it counts as a miss
+        """
+        now = time.time()
+        entry = self._lookup_local(key, now)
+        source = "local_hits"
+        if self.shared and (entry is None or (not allow_stale and now - entry[0] > self.ttl)):
+            entry = await self._lookup_shared(key, now)
+            source = "shared_hits"
+        if entry is not None:
+            stored_at, value = entry
+            if now - stored_at <= self.ttl:
+                self.counters[source] += 1
+                return value
+            if allow_stale:
+                # Stale but usable: answer now, refresh once in the background
+                self.counters["stale_hits"] += 1
+                if key not in self._inflight:
+                    self.counters["revalidations"] += 1
+                    self._start_fetch(key, fetch)
+                return value
+        task = self._inflight.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+        else:
+            self.counters["misses"] += 1
+            task = self._start_fetch(key, fetch)
+        return await asyncio.shield(task)
+
+    def _start_fetch(self, key: str, fetch) -> asyncio.Task:
+        task = asyncio.create_task(self._fetch_and_store(key, fetch))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._fetch_done(key, done))
+        return task
+
+    def _fetch_done(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.counters["errors"] += 1
+
+    async def _fetch_and_store(self, key: str, fetch):
+        value = await fetch()
+        stored_at = time.time()
+        self._remember(key, stored_at, value)
+        if self.shared:
+            await self._store_shared(key, stored_at, value)
+        return value
+
+    async def _lookup_shared(self, key: str, now: float):
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(EbayResponseCache.stored_at, EbayResponseCache.body).where(EbayResponseCache.key == key)
+                )
+                row = result.first()
+        except Exception as e:
+            logger.error(f"Error reading shared eBay response cache: {str(e)}")
+            return None
+        if row is None:
+            return None
+        stored_at = row.stored_at.timestamp()
+        if now - stored_at > self.ttl + self.stale:
+            return None
+        value = row.body.encode()
+        self._remember(key, stored_at, value)
+        return stored_at, value
+
+    async def _store_shared(self, key: str, stored_at: float, value):
+        stored = datetime.fromtimestamp(stored_at, timezone.utc)
+        statement = insert(EbayResponseCache).values(key=key, stored_at=stored, body=value.decode())
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[EbayResponseCache.key],
+                        set_={"stored_at": statement.excluded.stored_at, "body": statement.excluded.body},
+                    )
+                )
+                if time.monotonic() - self._last_purge >= EBAY_CACHE_PURGE_SECONDS:
+                    self._last_purge = time.monotonic()
+                    expired = datetime.fromtimestamp(time.time() - self.ttl - self.stale, timezone.utc)
+                    await session.execute(delete(EbayResponseCache).where(EbayResponseCache.stored_at < expired))
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Error writing shared eBay response cache: {str(e)}")
+
+    def stats(self) -> dict:
+        """Hit/miss counters, hit ratio and local size in entries and bytes."""
+        hits = sum(self.counters[name] for name in ("local_hits", "shared_hits", "stale_hits", "coalesced"))
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "shared": self.shared,
+        }
@@ -6,14 +6,29 @@ from typing import List
 import logging
 import traceback
 
+from country_codes import parse_locations
+from fetch_groups import fetch_key
 from models import User, SavedSearch
 from schemas import SavedSearchCreate, SavedSearchUpdate, SavedSearchResponse
 from dependencies import get_current_user
 from database_config import get_async_session
+from search_catalog import notify_search_changed
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def validated_locations(locations):
+    """Normalize a location list to ISO country codes, rejecting entries that are not countries."""
+    if locations is None:
+        return None
+    codes, unmapped = parse_locations(locations)
+    if unmapped:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown locations: {', '.join(unmapped)}. Use country names or ISO 3166 country codes."
+        )
+    return ",".join(codes)
+
 @router.post("/saved-searches", response_model=SavedSearchResponse)
 async def create_saved_search(
     saved_search: SavedSearchCreate,
@@ -21,6 +36,7 @@ async def create_saved_search(
     db: AsyncSession = Depends(get_async_session)
 ):
     """Create a new saved search for the current user."""
+    locations = validated_locations(saved_search.locations)
     try:
         new_saved_search = SavedSearch(
             user_id=current_user.id,
@@ -28,11 +44,13 @@ async def create_saved_search(
             min_price=saved_search.min_price,
             max_price=saved_search.max_price,
             frequency=saved_search.frequency,
-            locations=saved_search.locations,
+            locations=locations,
             listing_type=saved_search.listing_type
         )
         
         db.add(new_saved_search)
+        await db.flush()
+        await notify_search_changed(db, new_saved_search.id)
         await db.commit()
         await db.refresh(new_saved_search)
         
@@ -145,6 +163,8 @@ async def update_saved_search(
                 detail="Saved search not found"
             )
             
+        fetched_as = (fetch_key(saved_search), saved_search.min_price, saved_search.max_price)
+
         # Update fields if provided
         if saved_search_update.search_query is not None:
             saved_search.search_query = saved_search_update.search_query
@@ -155,12 +175,17 @@ async def update_saved_search(
         if saved_search_update.frequency is not None:
             saved_search.frequency = saved_search_update.frequency
         if saved_search_update.locations is not None:
-            saved_search.locations = saved_search_update.locations
+            saved_search.locations = validated_locations(saved_search_update.locations)
         if saved_search_update.listing_type is not None:
             saved_search.listing_type = saved_search_update.listing_type
+        # Listings seen so far were fetched for the old definition, so the
+        # next check only records a baseline instead of alerting on all of them
+        if (fetch_key(saved_search), saved_search.min_price, saved_search.max_price) != fetched_as:
+            saved_search.last_checked_at = None
             
         # Commit changes
         db.add(saved_search)
+        await notify_search_changed(db, saved_search.id)
         await db.commit()
         await db.refresh(saved_search)
         
@@ -209,6 +234,7 @@ async def delete_saved_search(
             
         # Delete the saved search
         await db.delete(saved_search)
+        await notify_search_changed(db, saved_search_id)
         await db.commit()
         
         return None
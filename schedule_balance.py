@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Report and rebalance how saved search checks are spread over time.
+
+Projects every search's upcoming due times into fixed-width buckets and
+prints the number of searches and distinct eBay fetches per bucket, with the
+peak to average ratio. ``rebalance`` moves unleased searches onto their
+hashed phase grid (see schedule_phase.py), which is needed once after
+upgrading since existing rows all start out due at the same moment.
+
+    python schedule_balance.py report --period 3600 --bucket 60
+    python schedule_balance.py rebalance --dry-run
+"""
+
+import argparse
+import asyncio
+import math
+import sys
+from datetime import datetime, timezone
+from sqlalchemy import bindparam, update
+from sqlalchemy.future import select
+
+from adaptive_polling import current_interval
+from database_config import AsyncSessionLocal
+from fetch_groups import fetch_key, fetch_key_id
+from models import SavedSearch, User
+from schedule_phase import align_due_time, phase_fraction
+
+def bucket_load(rows, now: datetime, period: int, bucket: int):
+    """
+    Project each search's due times over the next ``period`` seconds.
+
+    Returns:
+        Tuple of (searches due per bucket, distinct fetches due per bucket)
+    """
+    buckets = math.ceil(period / bucket)
+    searches = [0] * buckets
+    fetches = [set() for _ in range(buckets)]
+    start = now.timestamp()
+    for row in rows:
+        interval = current_interval(row)
+        key_id = fetch_key_id(fetch_key(row))
+        due = max(row.next_due_at.timestamp(), start)
+        while due < start + period:
+            index = int((due - start) // bucket)
+            searches[index] += 1
+            fetches[index].add(key_id)
+            due += interval
+    return searches, [len(keys) for keys in fetches]
+
+def print_load(searches, fetches, bucket: int):
+    """Print a per-bucket table and the peak to average ratio."""
+    print(f"{'offset':>8} {'searches':>9} {'fetches':>8}")
+    for index, (search_count, fetch_count) in enumerate(zip(searches, fetches)):
+        print(f"{index * bucket:>7}s {search_count:>9} {fetch_count:>8}")
+    average = sum(fetches) / len(fetches) if fetches else 0
+    peak = max(fetches) if fetches else 0
+    ratio = peak / average if average else 0
+    print(f"Fetches per {bucket}s bucket: peak {peak}, average {average:.1f}, peak/average {ratio:.2f}")
+
+async def load_rows(session):
+    """Load the scheduling columns for every saved search."""
+    result = await session.execute(
+        select(SavedSearch.id,
+               SavedSearch.search_query,
+               SavedSearch.listing_type,
+               SavedSearch.locations,
+               SavedSearch.frequency,
+               SavedSearch.next_due_at,
+               SavedSearch.poll_interval_seconds,
+               SavedSearch.lease_owner,
+               User.subscription_tier)
+        .join(User, SavedSearch.user_id == User.id)
+    )
+    return result.all()
+
+async def report(period: int, bucket: int):
+    """Print how due fetches are spread across the next ``period`` seconds."""
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        rows = await load_rows(session)
+    print(f"{len(rows)} saved searches")
+    print_load(*bucket_load(rows, now, period, bucket), bucket)
+
+async def rebalance(period: int, bucket: int, dry_run: bool, batch_size: int = 1000):
+    """Move every unleased search onto the next point of its phase grid."""
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        rows = await load_rows(session)
+        moves = []
+        projected = []
+        for row in rows:
+            if row.lease_owner is not None:
+                projected.append(row)
+                continue
+            phase = phase_fraction(fetch_key_id(fetch_key(row)))
+            due = align_due_time(now, current_interval(row), phase)
+            moves.append({"b_id": row.id, "b_next_due_at": due})
+            projected.append(row._replace(next_due_at=due))
+
+        print(f"Rebalancing {len(moves)} of {len(rows)} saved searches")
+        print_load(*bucket_load(projected, now, period, bucket), bucket)
+        if dry_run:
+            print("Dry run, nothing written")
+            return
+
+        table = SavedSearch.__table__
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("b_id"), table.c.lease_owner.is_(None))
+            .values(next_due_at=bindparam("b_next_due_at"))
+        )
+        for start in range(0, len(moves), batch_size):
+            await session.execute(statement, moves[start:start + batch_size])
+            await session.commit()
+        print("Done")
+
+def main():
+    """Main function to parse arguments and execute commands."""
+    parser = argparse.ArgumentParser(description='Report and rebalance saved search schedule load')
+    subparsers = parser.add_subparsers(dest='command', help='Command to execute')
+
+    for name, help_text in (('report', 'Show how due fetches are spread over a period'),
+                            ('rebalance', 'Move searches onto their phase grid')):
+        command_parser = subparsers.add_parser(name, help=help_text)
+        command_parser.add_argument('--period', type=int, default=3600, help='Window to project in seconds (default: 3600)')
+        command_parser.add_argument('--bucket', type=int, default=60, help='Bucket width in seconds (default: 60)')
+        if name == 'rebalance':
+            command_parser.add_argument('--dry-run', action='store_true', help='Show the projected spread without writing')
+
+    args = parser.parse_args()
+
+    if args.command == 'report':
+        asyncio.run(report(args.period, args.bucket))
+    elif args.command == 'rebalance':
+        asyncio.run(rebalance(args.period, args.bucket, args.dry_run))
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
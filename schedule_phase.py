@@ -0,0 +1,29 @@
+"""
+Stable phase offsets for saved search schedules.
+
+Every fetch key hashes to a fixed offset within PHASE_PERIOD, and a search
+is always rescheduled onto the next point of its grid
+(``offset mod interval + k * interval``). Searches are therefore spread
+evenly instead of piling up on the hour. Searches that share a fetch key
+share the offset, so as long as their intervals divide one another (see
+adaptive_polling.INTERVAL_LADDER) they keep landing together and can still
+share one eBay call.
+"""
+
+import hashlib
+import math
+from datetime import datetime, timedelta
+
+PHASE_PERIOD = 86400
+
+def phase_fraction(key_id: str) -> float:
+    """Map a fetch key id to a stable fraction of the period in [0, 1)."""
+    digest = hashlib.blake2b(key_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+def align_due_time(now: datetime, interval: int, phase: float) -> datetime:
+    """Return the first point on a ``phase`` grid with spacing ``interval`` strictly after ``now``."""
+    offset = (phase * PHASE_PERIOD) % interval
+    now_ts = now.timestamp()
+    slot = math.floor((now_ts - offset) / interval) + 1
+    return now + timedelta(seconds=slot * interval + offset - now_ts)
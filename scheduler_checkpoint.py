@@ -0,0 +1,145 @@
+"""
+Batched checkpoints for alert scheduler cycles.
+
+As fetch groups finish, their schedule updates (next_due_at,
+last_checked_at, adaptive stats) and seen listing sets are buffered and
+written in one transaction every SCHEDULER_CHECKPOINT_BATCH searches or
+SCHEDULER_CHECKPOINT_SECONDS, together with the worker's cycle progress
+row. A search is therefore either fully recorded as checked or still
+leased and unchecked; a restart never loses a recorded check and never
+repeats one. Flushes also renew the worker's leases every quarter lease,
+so searches in flight or still queued in memory are not claimed by
+another worker during a long cycle.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import SchedulerCheckpoint
+from search_leases import SCHEDULER_LEASE_SECONDS, WORKER_ID, drop_leases, extend_leases, release_searches
+from seen_listings import save_seen
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_CHECKPOINT_BATCH = int(os.getenv("SCHEDULER_CHECKPOINT_BATCH", "200"))
+SCHEDULER_CHECKPOINT_SECONDS = float(os.getenv("SCHEDULER_CHECKPOINT_SECONDS", "5"))
+
+class CheckpointWriter:
+    """Buffers finished groups for one cycle and flushes them in batches."""
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        cycle_started_at: datetime,
+        dispatched: int,
+        worker_id: str = WORKER_ID,
+        batch_size: int = SCHEDULER_CHECKPOINT_BATCH,
+        interval: float = SCHEDULER_CHECKPOINT_SECONDS,
+        lease_seconds: float = SCHEDULER_LEASE_SECONDS,
+    ):
+        self.session = session
+        self.cycle_started_at = cycle_started_at
+        self.dispatched = dispatched
+        self.completed = 0
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self.interval = interval
+        self.lease_seconds = lease_seconds
+        self._reschedules = []
+        self._seen = {}
+        self._lock = asyncio.Lock()
+        self._last_flush = time.monotonic()
+        self._last_renewal = time.monotonic()
+
+    async def start(self):
+        """Record that a new cycle has started with nothing completed yet."""
+        await self._record_progress(0, datetime.now(timezone.utc))
+        await self.session.commit()
+
+    async def add(self, reschedules, seen_sets: dict = None):
+        """Buffer the results of one finished group, flushing if the batch is due."""
+        self._reschedules.extend(reschedules)
+        self._seen.update(seen_sets or {})
+        if len(self._reschedules) >= self.batch_size or time.monotonic() - self._last_flush >= self.interval:
+            await self.flush()
+
+    async def flush(self):
+        """
+        Write everything buffered so far, plus cycle progress, in one transaction.
+
+        If the write fails the batch goes back into the buffer and is retried
+        with the next flush; if no later flush succeeds its searches keep
+        their leases, which lapse and let the searches be claimed again.
+        """
+        async with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._reschedules and not self._seen:
+                return
+            reschedules, self._reschedules = self._reschedules, []
+            seen_sets, self._seen = self._seen, {}
+            now = datetime.now(timezone.utc)
+            try:
+                await save_seen(self.session, seen_sets, now, commit=False)
+                await release_searches(self.session, reschedules, self.worker_id, commit=False)
+                renew = time.monotonic() - self._last_renewal >= SCHEDULER_LEASE_SECONDS / 4
+                if renew:
+                    until = now + timedelta(seconds=self.lease_seconds)
+                    await extend_leases(self.session, None, until, self.worker_id, commit=False)
+                await self._record_progress(len(reschedules), now)
+                await self.session.commit()
+            except Exception:
+                await self.session.rollback()
+                self._reschedules = reschedules + self._reschedules
+                self._seen = {**seen_sets, **self._seen}
+                raise
+            self.completed += len(reschedules)
+            if renew:
+                self._last_renewal = time.monotonic()
+
+    async def _record_progress(self, newly_completed: int, now: datetime):
+        statement = insert(SchedulerCheckpoint).values(
+            worker_id=self.worker_id,
+            cycle_started_at=self.cycle_started_at,
+            searches_dispatched=self.dispatched,
+            searches_completed=self.completed + newly_completed,
+            updated_at=now,
+        )
+        await self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[SchedulerCheckpoint.worker_id],
+                set_={
+                    "cycle_started_at": statement.excluded.cycle_started_at,
+                    "searches_dispatched": statement.excluded.searches_dispatched,
+                    "searches_completed": statement.excluded.searches_completed,
+                    "updated_at": statement.excluded.updated_at,
+                },
+            )
+        )
+
+async def resume_after_restart(session: AsyncSession, worker_id: str = WORKER_ID):
+    """
+    Log where this worker's last cycle stopped and free what it left unfinished.
+
+    Searches checked before the restart were already checkpointed and keep
+    their new schedule. Anything still leased to this worker was claimed
+    but never finished, so its lease is dropped and it is picked up again
+    straight away instead of after the lease expires.
+    """
+    result = await session.execute(
+        select(SchedulerCheckpoint).where(SchedulerCheckpoint.worker_id == worker_id)
+    )
+    checkpoint = result.scalars().first()
+    if checkpoint is not None and checkpoint.searches_completed < checkpoint.searches_dispatched:
+        logger.info(
+            f"Resuming after interrupted cycle started at {checkpoint.cycle_started_at}: "
+            f"{checkpoint.searches_completed} of {checkpoint.searches_dispatched} searches were checkpointed"
+        )
+    released = await drop_leases(session, worker_id)
+    if released:
+        logger.info(f"Released {released} saved searches left leased by {worker_id}")
@@ -0,0 +1,155 @@
+"""
+In-process metrics for the alert scheduler.
+
+Tracks due-vs-actual start lag per search, cycle duration, searches
+processed per second, eBay call latency and queue depth, with lag,
+throughput and depth broken down by search frequency and subscription
+tier. ``metrics.snapshot()`` is published for the /metrics/scheduler
+endpoint by worker_metrics and written as a periodic structured log line
+by the scheduler.
+"""
+
+import json
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_METRICS_LOG_SECONDS = float(os.getenv("SCHEDULER_METRICS_LOG_SECONDS", "60"))
+# Window used to compute searches processed per second
+THROUGHPUT_WINDOW_SECONDS = 300
+
+LAG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+CYCLE_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+def search_labels(search) -> str:
+    """Return the "frequency/tier" label for a claimed search row."""
+    frequency = getattr(search.frequency, "value", search.frequency)
+    tier = getattr(search.subscription_tier, "value", search.subscription_tier)
+    return f"{frequency}/{tier}"
+
+class Histogram:
+    """Fixed-bucket histogram with count and sum."""
+
+    __slots__ = ("bounds", "counts", "count", "total")
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, fraction: float) -> float:
+        """Estimate a quantile as the upper bound of its bucket; None past the last bound."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return float(bound)
+        return None
+
+    def snapshot(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+class SchedulerMetrics:
+    """Registry of the scheduler's counters, gauges and histograms."""
+
+    def __init__(self):
+        self.lag = defaultdict(lambda: Histogram(LAG_BUCKETS))
+        self.cycle_duration = Histogram(CYCLE_BUCKETS)
+        self.ebay_latency = Histogram(LATENCY_BUCKETS)
+        self.ebay_errors = 0
+        self.processed = defaultdict(int)
+        self.queue_depth = {}
+        self.groups_waiting = 0
+        self._recent = deque()
+        self._last_log = time.monotonic()
+
+    def observe_dispatch(self, searches, now: datetime):
+        """Record how late each search started relative to its due time."""
+        for search in searches:
+            lag = max(0.0, (now - search.next_due_at).total_seconds())
+            self.lag[search_labels(search)].observe(lag)
+
+    def observe_fetch(self, seconds: float, ok: bool = True):
+        """Record the latency of one eBay call."""
+        self.ebay_latency.observe(seconds)
+        if not ok:
+            self.ebay_errors += 1
+
+    def observe_cycle(self, seconds: float, searches):
+        """Record a finished cycle and the searches it processed."""
+        self.cycle_duration.observe(seconds)
+        for search in searches:
+            self.processed[search_labels(search)] += 1
+        now = time.monotonic()
+        self._recent.append((now, len(searches)))
+        while self._recent and now - self._recent[0][0] > THROUGHPUT_WINDOW_SECONDS:
+            self._recent.popleft()
+
+    def set_queue_depth(self, searches, groups_waiting: int):
+        """Replace the queue depth gauges from the searches currently held in memory."""
+        depth = defaultdict(int)
+        for search in searches:
+            depth[search_labels(search)] += 1
+        self.queue_depth = dict(depth)
+        self.groups_waiting = groups_waiting
+
+    def searches_per_second(self) -> float:
+        """Searches processed per second over the recent window."""
+        if not self._recent:
+            return 0.0
+        elapsed = max(time.monotonic() - self._recent[0][0], 1.0)
+        return sum(count for _, count in self._recent) / elapsed
+
+    def snapshot(self) -> dict:
+        return {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "cycles": self.cycle_duration.count,
+            "cycle_duration_seconds": self.cycle_duration.snapshot(),
+            "lag_seconds": {label: histogram.snapshot() for label, histogram in self.lag.items()},
+            "processed": dict(self.processed),
+            "searches_per_second": round(self.searches_per_second(), 3),
+            "ebay_latency_seconds": self.ebay_latency.snapshot(),
+            "ebay_errors": self.ebay_errors,
+            "queue_depth": dict(self.queue_depth),
+            "fetch_groups_waiting": self.groups_waiting,
+        }
+
+    def maybe_log(self):
+        """Write the snapshot as one JSON log line every SCHEDULER_METRICS_LOG_SECONDS."""
+        now = time.monotonic()
+        if now - self._last_log < SCHEDULER_METRICS_LOG_SECONDS:
+            return
+        self._last_log = now
+        logger.info(json.dumps({"event": "scheduler_metrics", **self.snapshot()}))
+
+metrics = SchedulerMetrics()
@@ -0,0 +1,260 @@
+"""
+In-memory catalog of saved search definitions for the alert scheduler.
+
+Search definitions (query, price window, filters and the owner's tier)
+rarely change, so the scheduler loads them once and keeps them current from
+Postgres ``LISTEN/NOTIFY``: the saved search routes publish the id of every
+search they create, update or delete on SEARCH_CHANGES_CHANNEL, and the
+catalog reloads just those rows on its next refresh. Claims then only need
+to return each search's schedule columns.
+
+Notifications are not durable, so every CATALOG_RECONCILE_SECONDS the
+catalog compares per-bucket checksums of the definitions with Postgres and
+reloads only the buckets that differ. That also picks up changes made
+outside the routes, such as a user's subscription tier changing or a user
+being deleted.
+
+Indexes over the definitions (such as the ``percolator``) can be attached
+with ``indexes``; the catalog calls their ``update(definition)``,
+``remove(search_id)`` and ``clear()`` as definitions change.
+"""
+
+import hashlib
+import logging
+import os
+import time
+from collections import defaultdict, namedtuple
+from sqlalchemy import String, cast, func, literal
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database_config import engine
+from models import SavedSearch, User
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CHANGES_CHANNEL = "saved_search_changes"
+CATALOG_RECONCILE_SECONDS = float(os.getenv("CATALOG_RECONCILE_SECONDS", "300"))
+# Searches are checksummed in id % CATALOG_BUCKETS buckets so a mismatch only
+# reloads a small slice of the table
+CATALOG_BUCKETS = 64
+
+DEFINITION_COLUMNS = (
+    SavedSearch.id,
+    SavedSearch.user_id,
+    SavedSearch.search_query,
+    SavedSearch.min_price,
+    SavedSearch.max_price,
+    SavedSearch.frequency,
+    SavedSearch.locations,
+    SavedSearch.listing_type,
+    User.subscription_tier,
+)
+
+SCHEDULE_COLUMNS = (
+    SavedSearch.id,
+    SavedSearch.next_due_at,
+    SavedSearch.last_checked_at,
+    SavedSearch.poll_interval_seconds,
+    SavedSearch.hit_rate,
+    SavedSearch.failure_count,
+)
+
+# Computed by Postgres for both loading and reconciling, so the two always agree
+ROW_DIGEST = func.md5(
+    func.concat_ws("|", *(func.coalesce(cast(column, String), "") for column in DEFINITION_COLUMNS))
+)
+
+SearchDefinition = namedtuple("SearchDefinition", [column.key for column in DEFINITION_COLUMNS])
+ClaimedSearch = namedtuple(
+    "ClaimedSearch", SearchDefinition._fields + tuple(column.key for column in SCHEDULE_COLUMNS[1:])
+)
+
+def bucket_checksum(digests) -> str:
+    """Checksum of a bucket's row digests in id order, matching the SQL in ``reconcile``."""
+    return hashlib.md5("".join(digests).encode()).hexdigest()
+
+async def notify_search_changed(session: AsyncSession, search_id: int):
+    """
+    Publish a saved search change to running catalogs.
+
+    The notification is part of the session's transaction, so Postgres only
+    delivers it once the change is committed and drops it on rollback.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    await session.execute(select(func.pg_notify(SEARCH_CHANGES_CHANNEL, str(search_id))))
+
+class SearchCatalog:
+    """Saved search definitions by id, kept current by change notifications."""
+
+    def __init__(self, reconcile_seconds: float = CATALOG_RECONCILE_SECONDS, indexes=()):
+        self.reconcile_seconds = reconcile_seconds
+        self.indexes = list(indexes)
+        self._searches = {}
+        self._digests = {}
+        self._changed = set()
+        self._stale = True
+        self._listener = None
+        self._driver_connection = None
+        self._next_listen_attempt = 0.0
+        self._last_reconcile = time.monotonic()
+
+    def __len__(self):
+        return len(self._searches)
+
+    def get(self, search_id: int):
+        return self._searches.get(search_id)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            self._changed.add(int(payload))
+        except ValueError:
+            logger.warning(f"Ignoring malformed saved search notification {payload!r}")
+
+    def _listening(self) -> bool:
+        return self._driver_connection is not None and not self._driver_connection.is_closed()
+
+    async def _listen(self) -> bool:
+        """Hold a dedicated connection open and subscribe it to the change channel."""
+        await self.close()
+        self._next_listen_attempt = time.monotonic() + self.reconcile_seconds
+        connection = None
+        try:
+            connection = await engine.connect()
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.add_listener(SEARCH_CHANGES_CHANNEL, self._on_notify)
+        except Exception as e:
+            logger.error(f"Could not listen for saved search changes, relying on reconciliation: {str(e)}")
+            if connection is not None:
+                await connection.close()
+            return False
+        self._listener = connection
+        self._driver_connection = raw.driver_connection
+        logger.info(f"Listening for saved search changes on {SEARCH_CHANGES_CHANNEL}")
+        return True
+
+    async def close(self):
+        """Stop listening and return the connection to the pool."""
+        if self._listener is None:
+            return
+        try:
+            if self._listening():
+                await self._driver_connection.remove_listener(SEARCH_CHANGES_CHANNEL, self._on_notify)
+            await self._listener.close()
+        except Exception as e:
+            logger.warning(f"Error closing saved search listener: {str(e)}")
+        self._listener = None
+        self._driver_connection = None
+
+    async def refresh(self, session: AsyncSession):
+        """
+        Bring the catalog up to date before a scheduler cycle.
+
+        Loads everything on first use or after the listener reconnects
+        (notifications may have been missed), otherwise reloads only the
+        searches that were notified, and reconciles when it is due. While
+        listening is unavailable it retries once per reconcile period.
+        """
+        if not self._listening() and time.monotonic() >= self._next_listen_attempt:
+            if await self._listen():
+                self._stale = True
+        if self._stale:
+            # Clear first so changes notified while loading are applied next time
+            self._changed = set()
+            await self._load(session)
+            self._stale = False
+            self._last_reconcile = time.monotonic()
+            logger.info(f"Loaded {len(self._searches)} saved searches into the catalog")
+            return
+        if self._changed:
+            changed, self._changed = self._changed, set()
+            await self._load(session, search_ids=changed)
+            logger.info(f"Applied {len(changed)} saved search changes to the catalog")
+        if time.monotonic() - self._last_reconcile >= self.reconcile_seconds:
+            await self.reconcile(session)
+
+    async def _load(self, session: AsyncSession, search_ids=None, buckets=None):
+        """Load definitions for all searches, or only the given ids or buckets, dropping any that are gone."""
+        query = select(*DEFINITION_COLUMNS, ROW_DIGEST.label("digest")).join(User, SavedSearch.user_id == User.id)
+        if search_ids is not None:
+            query = query.where(SavedSearch.id.in_(search_ids))
+            in_scope = set(search_ids).__contains__
+        elif buckets is not None:
+            query = query.where((SavedSearch.id % CATALOG_BUCKETS).in_(buckets))
+            in_scope = lambda search_id: search_id % CATALOG_BUCKETS in buckets
+        else:
+            in_scope = None
+        result = await session.execute(query)
+        if in_scope is None:
+            self._searches = {}
+            self._digests = {}
+            for index in self.indexes:
+                index.clear()
+        found = set()
+        for row in result.all():
+            *definition, digest = row
+            found.add(row.id)
+            if self._digests.get(row.id) == digest:
+                continue
+            definition = self._searches[row.id] = SearchDefinition(*definition)
+            self._digests[row.id] = digest
+            for index in self.indexes:
+                index.update(definition)
+        if in_scope is not None:
+            for search_id in [search_id for search_id in self._searches if in_scope(search_id) and search_id not in found]:
+                del self._searches[search_id]
+                del self._digests[search_id]
+                for index in self.indexes:
+                    index.remove(search_id)
+
+    async def reconcile(self, session: AsyncSession):
+        """
+        Compare per-bucket checksums with Postgres and reload buckets that differ.
+
+        Returns:
+            Number of buckets reloaded
+        """
+        self._last_reconcile = time.monotonic()
+        bucket = SavedSearch.id % CATALOG_BUCKETS
+        result = await session.execute(
+            select(
+                bucket.label("bucket"),
+                func.md5(func.string_agg(ROW_DIGEST, aggregate_order_by(literal(""), SavedSearch.id))).label("checksum"),
+            )
+            .join(User, SavedSearch.user_id == User.id)
+            .group_by("bucket")
+        )
+        remote = {row.bucket: row.checksum for row in result.all()}
+        local_digests = defaultdict(list)
+        for search_id in sorted(self._digests):
+            local_digests[search_id % CATALOG_BUCKETS].append(self._digests[search_id])
+        local = {number: bucket_checksum(digests) for number, digests in local_digests.items()}
+        mismatched = [number for number in set(remote) | set(local) if remote.get(number) != local.get(number)]
+        if mismatched:
+            logger.warning(f"Saved search catalog out of sync in {len(mismatched)} buckets, reloading them")
+            await self._load(session, buckets=set(mismatched))
+        return len(mismatched)
+
+    async def attach(self, session: AsyncSession, schedule_rows):
+        """
+        Combine claimed schedule rows with their catalog definitions.
+
+        Searches not in the catalog yet (created since the last refresh) are
+        loaded on the spot; rows whose search has since been deleted are dropped.
+
+        Returns:
+            List of ClaimedSearch tuples
+        """
+        missing = [row.id for row in schedule_rows if row.id not in self._searches]
+        if missing:
+            await self._load(session, search_ids=missing)
+        claimed = []
+        for row in schedule_rows:
+            definition = self._searches.get(row.id)
+            if definition is None:
+                logger.warning(f"Claimed saved search {row.id} no longer exists, skipping it")
+                continue
+            claimed.append(ClaimedSearch(*definition, *row[1:]))
+        return claimed
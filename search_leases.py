@@ -0,0 +1,236 @@
+"""
+Lease-based work distribution for the alert scheduler.
+
+Each scheduler process claims batches of due saved searches with
+``FOR UPDATE SKIP LOCKED`` and stamps them with its worker id and a lease
+expiry. Other processes skip rows that are locked or leased, so several
+workers can share the table without checking the same search twice. If a
+worker dies, its leases lapse and the searches are claimed again by
+whichever worker gets to them first.
+"""
+
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from sqlalchemy import and_, bindparam, or_, update
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import SavedSearch, User
+from search_catalog import SCHEDULE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process in lease_owner. A name that survives restarts (Heroku
+# sets DYNO, e.g. "worker.1") lets a restarted worker pick its own leases back up.
+WORKER_ID = os.getenv("WORKER_ID") or os.getenv("DYNO") or f"{socket.gethostname()}:{os.getpid()}"
+SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "300"))
+
+CLAIM_COLUMNS = (
+    SavedSearch.id,
+    SavedSearch.user_id,
+    SavedSearch.search_query,
+    SavedSearch.min_price,
+    SavedSearch.max_price,
+    SavedSearch.frequency,
+    SavedSearch.locations,
+    SavedSearch.listing_type,
+    SavedSearch.next_due_at,
+    SavedSearch.last_checked_at,
+    SavedSearch.poll_interval_seconds,
+    SavedSearch.hit_rate,
+    SavedSearch.failure_count,
+    User.subscription_tier,
+)
+
+async def claim_due_searches(
+    session: AsyncSession,
+    now: datetime,
+    horizon: datetime,
+    limit: int,
+    worker_id: str = WORKER_ID,
+    lease_seconds: int = SCHEDULER_LEASE_SECONDS,
+    tier=None,
+    catalog=None,
+):
+    """
+    Claim up to ``limit`` unleased searches due on or before ``horizon``.
+
+    When ``tier`` is given only searches owned by users on that
+    subscription tier are claimed. With a ``catalog`` the claim only
+    returns schedule columns and takes search definitions from memory.
+
+    The lease runs until ``lease_seconds`` past the horizon so a claimed
+    search stays ours while it waits in the scheduler's heap. The claim is
+    committed straight away to release the row locks.
+
+    Returns:
+        The claimed search rows with their owner's subscription tier,
+        earliest due first
+    """
+    conditions = [
+        SavedSearch.next_due_at <= horizon,
+        or_(SavedSearch.lease_expires_at.is_(None), SavedSearch.lease_expires_at < now),
+    ]
+    if tier is not None:
+        conditions.append(SavedSearch.user_id.in_(select(User.id).where(User.subscription_tier == tier)))
+    claimable = (
+        select(SavedSearch.id)
+        .where(*conditions)
+        .order_by(SavedSearch.next_due_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        update(SavedSearch)
+        .where(SavedSearch.id.in_(claimable))
+        .values(
+            lease_owner=worker_id,
+            lease_expires_at=horizon + timedelta(seconds=lease_seconds),
+        )
+        .returning(*(SCHEDULE_COLUMNS if catalog is not None else (SavedSearch.id,)))
+        .execution_options(synchronize_session=False)
+    )
+    if catalog is not None:
+        claimed = await catalog.attach(session, result.all())
+        await session.commit()
+        return claimed
+    claimed_ids = result.scalars().all()
+    claimed = []
+    if claimed_ids:
+        result = await session.execute(
+            select(*CLAIM_COLUMNS)
+            .join(User, SavedSearch.user_id == User.id)
+            .where(SavedSearch.id.in_(claimed_ids))
+            .order_by(SavedSearch.next_due_at)
+        )
+        claimed = result.all()
+    await session.commit()
+    return claimed
+
+async def claim_by_tier(
+    session: AsyncSession,
+    now: datetime,
+    horizon: datetime,
+    limit: int,
+    weights: dict,
+    tiers,
+    catalog=None,
+):
+    """
+    Split a claim of up to ``limit`` searches across tiers by weight.
+
+    Tiers are claimed in the given order, each taking its weighted share of
+    whatever capacity is left, so a busy low tier cannot crowd due searches
+    of a higher tier out of the batch and capacity a tier leaves unused
+    passes on to the next.
+    """
+    claimed = []
+    remaining = limit
+    for index, tier in enumerate(tiers):
+        if remaining <= 0:
+            break
+        remaining_weight = sum(weights.get(later, 1.0) for later in tiers[index:])
+        share = remaining if index == len(tiers) - 1 else max(1, int(remaining * weights.get(tier, 1.0) / remaining_weight))
+        rows = await claim_due_searches(session, now, horizon, share, tier=tier, catalog=catalog)
+        claimed.extend(rows)
+        remaining -= len(rows)
+    claimed.sort(key=lambda row: row.next_due_at)
+    return claimed
+
+async def extend_leases(
+    session: AsyncSession,
+    search_ids,
+    until: datetime,
+    worker_id: str = WORKER_ID,
+    commit: bool = True,
+):
+    """
+    Push out the lease on searches this worker is still holding in memory.
+
+    With ``search_ids`` None every lease held by ``worker_id`` is extended.
+    Pass ``commit=False`` to make the write part of a larger transaction.
+    """
+    conditions = [SavedSearch.lease_owner == worker_id]
+    if search_ids is not None:
+        if not search_ids:
+            return
+        conditions.append(SavedSearch.id.in_(search_ids))
+    await session.execute(
+        update(SavedSearch)
+        .where(*conditions)
+        .values(lease_expires_at=until)
+        .execution_options(synchronize_session=False)
+    )
+    if commit:
+        await session.commit()
+
+async def drop_leases(session: AsyncSession, worker_id: str = WORKER_ID, search_ids=None):
+    """
+    Hand leased searches back without touching their schedule.
+
+    With no ``search_ids`` every lease held by ``worker_id`` is dropped,
+    which is how a restarted worker frees what it had claimed but not
+    finished before it went down.
+
+    Returns:
+        Number of searches released
+    """
+    conditions = [SavedSearch.lease_owner == worker_id]
+    if search_ids is not None:
+        if not search_ids:
+            return 0
+        conditions.append(SavedSearch.id.in_(search_ids))
+    result = await session.execute(
+        update(SavedSearch)
+        .where(*conditions)
+        .values(lease_owner=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return result.rowcount
+
+async def release_searches(session: AsyncSession, reschedules, worker_id: str = WORKER_ID, commit: bool = True):
+    """
+    Store each search's new schedule and drop our lease in one batch.
+
+    Rows whose lease has since been taken over by another worker are left
+    alone, so a worker that overran its lease cannot clobber the new owner.
+    Pass ``commit=False`` to make the write part of a larger transaction.
+
+    Args:
+        reschedules: List of {"id", "next_due_at", "last_checked_at",
+            "poll_interval_seconds", "hit_rate", "failure_count"} dicts
+    """
+    if not reschedules:
+        return
+    table = SavedSearch.__table__
+    await session.execute(
+        update(table)
+        .where(and_(table.c.id == bindparam("b_id"), table.c.lease_owner == bindparam("b_owner")))
+        .values(
+            next_due_at=bindparam("b_next_due_at"),
+            last_checked_at=bindparam("b_last_checked_at"),
+            poll_interval_seconds=bindparam("b_poll_interval_seconds"),
+            hit_rate=bindparam("b_hit_rate"),
+            failure_count=bindparam("b_failure_count"),
+            lease_owner=None,
+            lease_expires_at=None,
+        ),
+        [
+            {
+                "b_id": item["id"],
+                "b_owner": worker_id,
+                "b_next_due_at": item["next_due_at"],
+                "b_last_checked_at": item["last_checked_at"],
+                "b_poll_interval_seconds": item["poll_interval_seconds"],
+                "b_hit_rate": item["hit_rate"],
+                "b_failure_count": item["failure_count"],
+            }
+            for item in reschedules
+        ],
+    )
+    if commit:
+        await session.commit()
@@ -0,0 +1,264 @@
+"""
+Compact store of eBay listings already seen by each fetch key.
+
+Item numbers are kept in a sorted ``array('Q')`` with parallel
+``array('I')`` columns of first-seen and last-seen unix timestamps, so
+membership checks are a binary search and a few thousand items fit in a
+few tens of KB. Sets are persisted to the ``seen_listings`` table as zlib
+compressed, delta encoded blobs. Entries not returned by any fetch for
+SEEN_RETENTION_DAYS (or the least recently seen beyond SEEN_MAX_ITEMS per
+key) are evicted before saving, so a long-lived listing that keeps showing
+up in results is never forgotten and re-stamped as new.
+
+Several workers can hold the same fetch key in memory at once (a search
+and its group members may be leased by different workers), so saving
+never just overwrites the row: the stored set is re-read under a row lock
+and this worker's additions are merged into it.
+"""
+
+import logging
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from sqlalchemy import bindparam, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import SeenListing
+
+logger = logging.getLogger(__name__)
+
+SEEN_RETENTION_DAYS = int(os.getenv("SEEN_RETENTION_DAYS", "30"))
+SEEN_MAX_ITEMS = int(os.getenv("SEEN_MAX_ITEMS", "10000"))
+# A listing's last-seen stamp only moves once it is this much behind, so
+# polls returning the same listings do not rewrite the blob every time
+LAST_SEEN_RESOLUTION = 86400
+
+# Version 1 blobs have no last-seen column; it is read as the first-seen one
+BLOB_VERSION = 2
+BLOB_HEADER = struct.Struct("<BI")
+
+def _to_little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _from_little_endian(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+class SeenListings:
+    """Sorted item numbers with first-seen and last-seen timestamps for one fetch key."""
+
+    __slots__ = ("ids", "first_seen", "last_seen", "dirty", "pending")
+
+    def __init__(self, ids: array = None, first_seen: array = None, last_seen: array = None):
+        self.ids = ids if ids is not None else array("Q")
+        self.first_seen = first_seen if first_seen is not None else array("I")
+        self.last_seen = last_seen if last_seen is not None else array("I", self.first_seen)
+        self.dirty = False
+        # (first seen, last seen) of numbers added or re-seen since the last
+        # save, for merging into the stored set
+        self.pending = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, number):
+        return self.first_seen_at(number) is not None
+
+    def first_seen_at(self, number: int):
+        """Return when an item was first seen, or None if it never was."""
+        index = bisect_left(self.ids, number)
+        if index < len(self.ids) and self.ids[index] == number:
+            return self.first_seen[index]
+        return None
+
+    def observe(self, numbers, seen_at: int):
+        """
+        Record item numbers from a fetch, stamping unseen ones with ``seen_at``.
+
+        Unseen numbers are inserted in place at their sorted position, so a
+        poll that turns up a few new listings costs a few binary searches
+        and memmoves instead of rebuilding the arrays. Known numbers have
+        their last-seen stamp moved up once it is LAST_SEEN_RESOLUTION old.
+        """
+        ids = self.ids
+        first_seen = self.first_seen
+        last_seen = self.last_seen
+        for number in sorted(set(numbers)):
+            index = bisect_left(ids, number)
+            if index < len(ids) and ids[index] == number:
+                if seen_at - last_seen[index] >= LAST_SEEN_RESOLUTION:
+                    last_seen[index] = seen_at
+                    self.pending[number] = (first_seen[index], seen_at)
+                    self.dirty = True
+                continue
+            ids.insert(index, number)
+            first_seen.insert(index, seen_at)
+            last_seen.insert(index, seen_at)
+            self.pending[number] = (seen_at, seen_at)
+            self.dirty = True
+
+    def merge_into(self, stored: "SeenListings"):
+        """
+        Apply this set's unsaved changes to ``stored`` and adopt the result.
+
+        Items another worker saved in the meantime are kept, and an item both
+        saw keeps the earlier first-seen and the later last-seen time.
+        """
+        ids = stored.ids
+        first_seen = stored.first_seen
+        last_seen = stored.last_seen
+        for number in sorted(self.pending):
+            first, last = self.pending[number]
+            index = bisect_left(ids, number)
+            if index < len(ids) and ids[index] == number:
+                first_seen[index] = min(first_seen[index], first)
+                last_seen[index] = max(last_seen[index], last)
+                continue
+            ids.insert(index, number)
+            first_seen.insert(index, first)
+            last_seen.insert(index, last)
+        self.ids = ids
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+
+    def evict(self, cutoff: int, max_items: int = SEEN_MAX_ITEMS):
+        """Drop items last seen before ``cutoff`` and keep at most the ``max_items`` most recently seen."""
+        keep = [i for i, stamp in enumerate(self.last_seen) if stamp >= cutoff]
+        if len(keep) > max_items:
+            keep.sort(key=lambda i: self.last_seen[i])
+            keep = sorted(keep[-max_items:])
+        if len(keep) == len(self.ids):
+            return
+        self.ids = array("Q", (self.ids[i] for i in keep))
+        self.first_seen = array("I", (self.first_seen[i] for i in keep))
+        self.last_seen = array("I", (self.last_seen[i] for i in keep))
+        self.dirty = True
+
+    def to_blob(self) -> bytes:
+        """Serialize to a compressed blob: header, delta encoded ids, first-seen and last-seen stamps."""
+        deltas = array("Q", self.ids)
+        for i in range(len(deltas) - 1, 0, -1):
+            deltas[i] -= deltas[i - 1]
+        payload = (
+            BLOB_HEADER.pack(BLOB_VERSION, len(self.ids))
+            + _to_little_endian(deltas)
+            + _to_little_endian(self.first_seen)
+            + _to_little_endian(self.last_seen)
+        )
+        return zlib.compress(payload)
+
+    @classmethod
+    def from_blob(cls, blob: bytes) -> "SeenListings":
+        """Rebuild a set from a blob written by ``to_blob``."""
+        payload = zlib.decompress(blob)
+        version, count = BLOB_HEADER.unpack_from(payload)
+        if version not in (1, BLOB_VERSION):
+            raise ValueError(f"Unsupported seen listings blob version {version}")
+        start = BLOB_HEADER.size
+        ids = _from_little_endian("Q", payload[start:start + count * 8])
+        first_seen = _from_little_endian("I", payload[start + count * 8:start + count * 12])
+        last_seen = None
+        if version > 1:
+            last_seen = _from_little_endian("I", payload[start + count * 12:start + count * 16])
+        for i in range(1, len(ids)):
+            ids[i] += ids[i - 1]
+        return cls(ids, first_seen, last_seen)
+
+async def load_seen(session: AsyncSession, keys):
+    """
+    Load the seen sets for a batch of fetch key ids in one query.
+
+    Returns:
+        Dict with an entry for every key; keys with nothing stored get an
+        empty set
+    """
+    keys = list(keys)
+    seen_sets = {key: SeenListings() for key in keys}
+    if not keys:
+        return seen_sets
+    result = await session.execute(
+        select(SeenListing.fetch_key, SeenListing.item_ids).where(SeenListing.fetch_key.in_(keys))
+    )
+    for fetch_key, blob in result.all():
+        try:
+            seen_sets[fetch_key] = SeenListings.from_blob(blob)
+        except Exception as e:
+            logger.error(f"Discarding unreadable seen listings for {fetch_key}: {str(e)}")
+    return seen_sets
+
+async def save_seen(session: AsyncSession, seen_sets, now: datetime = None, commit: bool = True):
+    """
+    Evict old entries and merge every changed seen set into its stored row.
+
+    Missing rows are created first, then all changed rows are locked with
+    ``SELECT ... FOR UPDATE`` in key order, so concurrent savers of the same
+    key queue up instead of overwriting each other. Each stored set gets
+    this worker's additions merged in and is written back in one batch.
+    Pass ``commit=False`` to make the write part of a larger transaction.
+    """
+    now = now or datetime.now(timezone.utc)
+    cutoff = int(now.timestamp()) - SEEN_RETENTION_DAYS * 86400
+    changed = {}
+    for fetch_key, seen in seen_sets.items():
+        seen.evict(cutoff)
+        if seen.dirty:
+            changed[fetch_key] = seen
+    if not changed:
+        return
+    keys = sorted(changed)
+    empty = SeenListings().to_blob()
+    await session.execute(
+        insert(SeenListing)
+        .values([{"fetch_key": key, "item_ids": empty, "item_count": 0, "updated_at": now} for key in keys])
+        .on_conflict_do_nothing(index_elements=[SeenListing.fetch_key])
+    )
+    result = await session.execute(
+        select(SeenListing.fetch_key, SeenListing.item_ids)
+        .where(SeenListing.fetch_key.in_(keys))
+        .order_by(SeenListing.fetch_key)
+        .with_for_update()
+    )
+    rows = []
+    for fetch_key, blob in result.all():
+        seen = changed[fetch_key]
+        try:
+            stored = SeenListings.from_blob(blob)
+        except Exception as e:
+            logger.error(f"Overwriting unreadable seen listings for {fetch_key}: {str(e)}")
+            stored = SeenListings(array("Q", seen.ids), array("I", seen.first_seen), array("I", seen.last_seen))
+        seen.merge_into(stored)
+        seen.evict(cutoff)
+        rows.append({
+            "b_fetch_key": fetch_key,
+            "b_item_ids": seen.to_blob(),
+            "b_item_count": len(seen),
+            "b_updated_at": now,
+        })
+    table = SeenListing.__table__
+    await session.execute(
+        update(table)
+        .where(table.c.fetch_key == bindparam("b_fetch_key"))
+        .values(
+            item_ids=bindparam("b_item_ids"),
+            item_count=bindparam("b_item_count"),
+            updated_at=bindparam("b_updated_at"),
+        ),
+        rows,
+    )
+    if commit:
+        await session.commit()
+    for seen in changed.values():
+        seen.pending = {}
+        seen.dirty = False
@@ -0,0 +1,43 @@
+"""
+Standalone alert worker process.
+
+Runs the saved search scheduler outside the web dyno so slow fetch batches
+never add latency to API requests, and so web and worker dynos can be
+scaled independently (``heroku ps:scale worker=N``). Shares ``models`` and
+``database_config`` with the web app but sizes its own connection pool and
+fetch concurrency from the WORKER_* settings.
+
+Usage:
+    python worker.py
+"""
+
+import asyncio
+import logging
+import os
+
+# Worker settings take precedence over the web dyno's; they must be applied
+# before database_config creates the engine and alert_scheduler reads its config.
+os.environ["DB_POOL_SIZE"] = os.getenv("WORKER_DB_POOL_SIZE", "5")
+os.environ["DB_MAX_OVERFLOW"] = os.getenv("WORKER_DB_MAX_OVERFLOW", "5")
+os.environ["DB_ECHO"] = os.getenv("WORKER_DB_ECHO", "false")
+os.environ["SCHEDULER_CONCURRENCY"] = os.getenv("WORKER_CONCURRENCY", os.getenv("SCHEDULER_CONCURRENCY", "50"))
+
+from alert_scheduler import run_scheduler
+from database_config import engine
+
+logger = logging.getLogger(__name__)
+
+async def main():
+    """Run the scheduler until SIGTERM, then close the connection pool."""
+    try:
+        await run_scheduler()
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO"),
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+    )
+    logger.info("Starting alert worker")
+    asyncio.run(main())
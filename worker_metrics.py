@@ -0,0 +1,84 @@
+"""
+Worker metrics published through Postgres for the web app to serve.
+
+The scheduler and the eBay client only run in the alert worker (see
+worker.py), so their in-memory metrics are invisible to the web dyno.
+Every WORKER_METRICS_SECONDS the worker writes a JSON snapshot of them to
+its row in ``worker_metrics``, and the /metrics/* routes read the latest
+row of every worker. Workers that stopped publishing more than
+WORKER_METRICS_MAX_AGE_SECONDS ago are left out.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database_config import AsyncSessionLocal
+from ebay_client import get_ebay_client
+from models import WorkerMetrics
+from scheduler_metrics import metrics
+from search_leases import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+WORKER_METRICS_SECONDS = float(os.getenv("WORKER_METRICS_SECONDS", "15"))
+WORKER_METRICS_MAX_AGE_SECONDS = float(os.getenv("WORKER_METRICS_MAX_AGE_SECONDS", "300"))
+
+def collect_sections() -> dict:
+    """Snapshot of everything this worker publishes, by section name."""
+    client = get_ebay_client()
+    return {
+        "scheduler": metrics.snapshot(),
+        "ebay_cache": client.cache.stats(),
+        "ebay_endpoints": {path: guard.snapshot() for path, guard in client.guards.items()},
+        "ebay_concurrency": client.concurrency.snapshot(),
+    }
+
+async def publish_metrics(session: AsyncSession, worker_id: str = WORKER_ID, now: datetime = None):
+    """Write this worker's current snapshot to its ``worker_metrics`` row."""
+    now = now or datetime.now(timezone.utc)
+    statement = insert(WorkerMetrics).values(worker_id=worker_id, snapshot=collect_sections(), updated_at=now)
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[WorkerMetrics.worker_id],
+            set_={"snapshot": statement.excluded.snapshot, "updated_at": statement.excluded.updated_at},
+        )
+    )
+    await session.commit()
+
+async def load_worker_metrics(session: AsyncSession, section: str, max_age: float = WORKER_METRICS_MAX_AGE_SECONDS):
+    """
+    Read one section of the latest snapshot from every recently active worker.
+
+    Returns:
+        Dict mapping worker id to {"updated_at", "metrics"}
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age)
+    result = await session.execute(
+        select(WorkerMetrics.worker_id, WorkerMetrics.snapshot, WorkerMetrics.updated_at)
+        .where(WorkerMetrics.updated_at >= cutoff)
+        .order_by(WorkerMetrics.worker_id)
+    )
+    return {
+        worker_id: {"updated_at": updated_at.isoformat(), "metrics": (snapshot or {}).get(section)}
+        for worker_id, snapshot, updated_at in result.all()
+    }
+
+async def run_metrics_publisher(stop: asyncio.Event):
+    """Publish this worker's metrics every WORKER_METRICS_SECONDS until ``stop`` is set, and once more on the way out."""
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                await publish_metrics(session)
+        except Exception as e:
+            logger.error(f"Error publishing worker metrics: {str(e)}")
+        if stop.is_set():
+            return
+        try:
+            await asyncio.wait_for(stop.wait(), WORKER_METRICS_SECONDS)
+        except asyncio.TimeoutError:
+            pass